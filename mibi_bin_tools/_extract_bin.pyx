@@ -1,11 +1,14 @@
 from cython.view cimport array as cvarray
 from cython cimport cdivision, boundscheck, wraparound
 
-from libc.stdlib cimport malloc, free, realloc, qsort
+from libc.stdlib cimport malloc, free, realloc
 from libc.string cimport memcpy, memset
 from libc.stdio cimport fopen, fclose, FILE, EOF, fseek, SEEK_SET, SEEK_CUR, fread
 from libc.limits cimport USHRT_MAX
 
+import mmap
+import os
+
 import numpy as np
 cimport numpy as np
 
@@ -17,26 +20,53 @@ ctypedef np.uint8_t SMALL_t
 @boundscheck(False) # Deactivate bounds checking
 @wraparound(False)  # Deactivate negative indexing
 @cdivision(True) # Ignore modulo/divide by zero warning
-cdef inline int _minimum_larger_value_in_sorted(const DTYPE_t[:] low_range, DTYPE_t val) nogil:
-    """ minimal bianry search impl
-    """
-    cdef int start, end, ans, mid
+cdef inline int _advance_to_larger_value_in_sorted(const DTYPE_t[::1] low_range, DTYPE_t val,
+                                                   int cursor) nogil:
+    """ Finds the first index of a sorted array whose value is at least `val`
 
-    start = 0
-    end = low_range.shape[0] - 1
-    ans = -1
+    Pulse times mostly increase within a trigger, so the search gallops forward from the previous
+    answer, doubling its stride until it passes `val`, and then bisects the last stride.  An
+    answer d indices past the cursor costs O(log d), and never more than twice a plain binary
+    search.  Values behind the cursor bisect the indices before it.
 
-    while start <= end:
+    Args:
+        low_range (uint16_t[]):
+            Sorted starting integration ranges
+        val (uint16_t):
+            Pulse time to look up
+        cursor (int):
+            Previous answer, in [0, len(low_range)]
+
+    Returns:
+        int:
+            First index with `low_range[index] >= val`, or len(low_range) if there is none
+    """
+    cdef int num_ranges = low_range.shape[0]
+    cdef int start, end, mid, stride
+
+    # the answer lies within [start, end]; end == num_ranges stands for no answer
+    if cursor > 0 and low_range[cursor - 1] >= val:
+        start = 0
+        end = cursor - 1
+    else:
+        start = cursor
+        end = cursor
+        stride = 1
+        while end < num_ranges and low_range[end] < val:
+            start = end + 1
+            end = start + stride
+            stride *= 2
+        if end > num_ranges:
+            end = num_ranges
+
+    while start < end:
         mid = (start + end) // 2
-
         if low_range[mid] < val:
             start = mid + 1
-
         else:
-            ans = mid
-            end = mid - 1
+            end = mid
 
-    return ans
+    return start
 
 
 @boundscheck(False) # Deactivate bounds checking
@@ -76,13 +106,50 @@ cdef inline void _check_buffer_refill(FILE* fp, char* file_buffer, MAXINDEX_t *b
     return
 
 
-#@boundscheck(False) # Deactivate bounds checking
+cdef inline MAXINDEX_t _read_header(FILE* fp, DTYPE_t* num_x, DTYPE_t* num_y,
+                                    DTYPE_t* num_trig) nogil:
+    """ Reads bin file dimensions from the header
+
+    Args:
+        fp (FILE*):
+            File pointer
+        num_x (uint16_t *):
+            Filled with the number of pixels along x
+        num_y (uint16_t *):
+            Filled with the number of pixels along y
+        num_trig (uint16_t *):
+            Filled with the number of triggers per pixel
+
+    Returns:
+        uint64_t:
+            Offset of the pulse data within the file
+    """
+    cdef DTYPE_t num_frames, desc_len
+
+    # note, if cython has packed structs, this would be easier
+    # or even macros tbh
+    fseek(fp, 0x6, SEEK_SET)
+    fread(num_x, sizeof(DTYPE_t), 1, fp)
+    fread(num_y, sizeof(DTYPE_t), 1, fp)
+    fread(num_trig, sizeof(DTYPE_t), 1, fp)
+    fread(&num_frames, sizeof(DTYPE_t), 1, fp)
+    fseek(fp, 0x2, SEEK_CUR)
+    fread(&desc_len, sizeof(DTYPE_t), 1, fp)
+
+    return \
+        <MAXINDEX_t>(num_x[0]) * <MAXINDEX_t>(num_y[0]) * <MAXINDEX_t>(num_frames) * 8 + desc_len + 0x12
+
+
+@boundscheck(False) # Deactivate bounds checking
 @wraparound(False)  # Deactivate negative indexing
 @cdivision(True) # Ignore modulo/divide by zero warning
-cdef INT_t[:, :, :, :] _extract_bin(const char* filename, 
-                                    const DTYPE_t[:] low_range, const DTYPE_t[:] high_range,
-                                    const SMALL_t[:] calc_intensity):
-    """ Extracts bin file to single channel tifs
+cdef void _extract_bin_into(const char* filename,
+                            const DTYPE_t[::1] low_range, const DTYPE_t[::1] high_range,
+                            const SMALL_t[::1] calc_intensity,
+                            INT_t[:, :, ::1] img_data_view) nogil:
+    """ Accumulates a bin file's pulses into a preallocated image buffer
+
+    The buffer is left untouched if its pixel count doesn't match the bin file.
 
     Args:
         filename (const char*):
@@ -92,44 +159,32 @@ cdef INT_t[:, :, :, :] _extract_bin(const char* filename,
         high_range (uint16_t[]):
             Stoping integration ranges for each tif
         calc_intensity (bool):
-            Calculate intensity and intensity*width images.  Not implemented.
+            Calculate intensity and intensity*width images.
+        img_data_view (uint32_t[:, :, :]):
+            Zeroed buffer of shape (num_planes, num_x * num_y, len(low_range)).  Three planes hold
+            pulse counts, intensities and intensity * width, two planes drop the latter, and a
+            single plane holds intensities in place of pulse counts where `calc_intensity` is set
     """
-    cdef DTYPE_t num_x, num_y, num_trig, num_frames, desc_len, trig, num_pulses, pulse, time
+    cdef DTYPE_t num_x, num_y, num_trig, trig, num_pulses, pulse, time
     cdef DTYPE_t intensity
     cdef SMALL_t width
-    cdef MAXINDEX_t data_start, pix 
-    cdef int idx
-
-    # 10MB buffer
-    cdef MAXINDEX_t BUFFER_SIZE = 10 * 1024 * 1024
-    cdef char* file_buffer = <char*> malloc(BUFFER_SIZE * sizeof(char))
-    cdef MAXINDEX_t buffer_idx = 0
+    cdef MAXINDEX_t data_start, pix
+    cdef int idx, chan
+    cdef Py_ssize_t num_planes = img_data_view.shape[0]
 
     # open file
     cdef FILE* fp
     fp = fopen(filename, "rb")
 
-    # note, if cython has packed structs, this would be easier
-    # or even macros tbh
-    fseek(fp, 0x6, SEEK_SET)
-    fread(&num_x, sizeof(DTYPE_t), 1, fp)
-    fread(&num_y, sizeof(DTYPE_t), 1, fp)
-    fread(&num_trig, sizeof(DTYPE_t), 1, fp)
-    fread(&num_frames, sizeof(DTYPE_t), 1, fp)
-    fseek(fp, 0x2, SEEK_CUR)
-    fread(&desc_len, sizeof(DTYPE_t), 1, fp)
+    data_start = _read_header(fp, &num_x, &num_y, &num_trig)
+    if <MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y) != <MAXINDEX_t>img_data_view.shape[1]:
+        fclose(fp)
+        return
 
-    data_start = \
-        <MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y) * <MAXINDEX_t>(num_frames) * 8 + desc_len + 0x12
-
-    img_data = \
-        cvarray(
-            shape=(3, <MAXINDEX_t>num_x * <MAXINDEX_t>num_y, low_range.shape[0]),
-            itemsize=sizeof(INT_t),
-            format='I'
-        )
-    cdef INT_t[:, :, :] img_data_view = img_data
-    img_data_view[:, :, :] = 0
+    # 10MB buffer
+    cdef MAXINDEX_t BUFFER_SIZE = 10 * 1024 * 1024
+    cdef char* file_buffer = <char*> malloc(BUFFER_SIZE * sizeof(char))
+    cdef MAXINDEX_t buffer_idx = 0
 
     fseek(fp, data_start, SEEK_SET)
     fread(file_buffer, sizeof(char), BUFFER_SIZE, fp)
@@ -140,117 +195,147 @@ cdef INT_t[:, :, :, :] _extract_bin(const char* filename,
             _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x8 * sizeof(char), BUFFER_SIZE)
             memcpy(&num_pulses, file_buffer + buffer_idx + 0x6, sizeof(time))
             buffer_idx += 0x8
+            # pulse times start over with each trigger, and so does the cursor
+            idx = 0
             for pulse in range(num_pulses):
                 _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x5 * sizeof(char), BUFFER_SIZE)
                 memcpy(&time, file_buffer + buffer_idx, sizeof(time))
                 memcpy(&width, file_buffer + buffer_idx + 0x2, sizeof(width))
                 memcpy(&intensity, file_buffer + buffer_idx + 0x3, sizeof(intensity))
                 buffer_idx += 0x5
-                idx = _minimum_larger_value_in_sorted(low_range, time)
+                # the pulse can only belong to the last range starting at or before it
+                idx = _advance_to_larger_value_in_sorted(low_range, time, idx)
                 if idx > 0:
-                    if time <= high_range[idx - 1]:
-                        img_data_view[0, pix, idx - 1] += 1
-                        if calc_intensity[idx - 1]:
-                            img_data_view[1, pix, idx - 1] += intensity
-                            img_data_view[2, pix, idx - 1] += intensity * width
-                elif idx == -1:
-                    if time <= high_range[low_range.shape[0] - 1]:
-                        img_data_view[0, pix, low_range.shape[0] - 1] += 1
-                        if calc_intensity[low_range.shape[0] - 1]:
-                            img_data_view[1, pix, low_range.shape[0] - 1] += intensity
-                            img_data_view[2, pix, low_range.shape[0] - 1] += intensity * width
+                    chan = idx - 1
+                    if time <= high_range[chan]:
+                        if not calc_intensity[chan]:
+                            img_data_view[0, pix, chan] += 1
+                        elif num_planes == 1:
+                            img_data_view[0, pix, chan] += intensity
+                        else:
+                            img_data_view[0, pix, chan] += 1
+                            img_data_view[1, pix, chan] += intensity
+                            if num_planes > 2:
+                                img_data_view[2, pix, chan] += intensity * width
     fclose(fp)
     free(file_buffer)
 
-    return np.asarray(img_data, dtype=np.uint32).reshape((3, num_x, num_y, low_range.shape[0]))
+
+cdef INT_t[:, :, :, :] _extract_bin(const char* filename,
+                                    const DTYPE_t[::1] low_range, const DTYPE_t[::1] high_range,
+                                    const SMALL_t[::1] calc_intensity):
+    """ Extracts bin file to single channel tifs
+
+    Args:
+        filename (const char*):
+            Name of bin file to extract
+        low_range (uint16_t[]):
+            Starting integration ranges for each tif
+        high_range (uint16_t[]):
+            Stoping integration ranges for each tif
+        calc_intensity (bool):
+            Calculate intensity and intensity*width images.
+    """
+    num_x, num_y = c_read_frame_size(filename)
+
+    img_data = np.zeros((3, num_x * num_y, low_range.shape[0]), dtype=np.uint32)
+    cdef INT_t[:, :, ::1] img_data_view = img_data
+
+    with nogil:
+        _extract_bin_into(filename, low_range, high_range, calc_intensity, img_data_view)
+
+    return img_data.reshape((3, num_x, num_y, low_range.shape[0]))
 
 
 @boundscheck(False) # Deactivate bounds checking
 @wraparound(False)  # Deactivate negative indexing
 @cdivision(True) # Ignore modulo/divide by zero warning
-cdef void _extract_histograms(const char* filename, DTYPE_t low_range,
+cdef void _extract_histograms(const unsigned char[::1] buf, DTYPE_t low_range,
                               DTYPE_t high_range, MAXINDEX_t* widths, MAXINDEX_t* intensities,
-                              MAXINDEX_t* pulse_counts):
+                              MAXINDEX_t* pulse_counts, double* mean_pp) nogil:
     """ Creates histogram of observed peak widths within specified integration range
 
+    Pulses are read straight from the bin file's bytes (e.g a memory map), so no read buffer is
+    filled or refilled.  Truncated files are read up to their last complete trigger.  The mean
+    number of pulses per positive pixel is gathered in the same pass.
+
     Args:
-        filename (const char*):
-            Name of bin file to extract.
+        buf (const unsigned char[::1]):
+            Contents of the bin file
         low_range (uint16_t):
             Low time range for integration
         high_range (uint16_t):
             High time range for integration
+        mean_pp (double *):
+            Filled with the mean number of pulses within range per positive pixel
     """
     cdef DTYPE_t num_x, num_y, num_trig, num_frames, desc_len, trig, num_pulses, pulse, time
     cdef DTYPE_t intensity
     cdef SMALL_t width
-    cdef MAXINDEX_t data_start, pix 
-    cdef int idx
+    cdef MAXINDEX_t data_start, pix, buffer_idx
+    cdef MAXINDEX_t buffer_size = buf.shape[0]
     cdef DTYPE_t p_cnt = 0
+    cdef MAXINDEX_t pix_count, total_count = 0, pp_count = 0
 
-    # 10MB buffer
-    cdef MAXINDEX_t BUFFER_SIZE = 10 * 1024 * 1024
-    cdef char* file_buffer = <char*> malloc(BUFFER_SIZE * sizeof(char))
-    cdef MAXINDEX_t buffer_idx = 0
+    mean_pp[0] = 0.0
+    if buffer_size < 0x12:
+        return
+    cdef const unsigned char* data = &buf[0]
 
-    # open file
-    cdef FILE* fp
-    fp = fopen(filename, "rb")
-
-    # note, if cython has packed structs, this would be easier
-    # or even macros tbh
-    fseek(fp, 0x6, SEEK_SET)
-    fread(&num_x, sizeof(DTYPE_t), 1, fp)
-    fread(&num_y, sizeof(DTYPE_t), 1, fp)
-    fread(&num_trig, sizeof(DTYPE_t), 1, fp)
-    fread(&num_frames, sizeof(DTYPE_t), 1, fp)
-    fseek(fp, 0x2, SEEK_CUR)
-    fread(&desc_len, sizeof(DTYPE_t), 1, fp)
+    memcpy(&num_x, data + 0x6, sizeof(DTYPE_t))
+    memcpy(&num_y, data + 0x8, sizeof(DTYPE_t))
+    memcpy(&num_trig, data + 0xA, sizeof(DTYPE_t))
+    memcpy(&num_frames, data + 0xC, sizeof(DTYPE_t))
+    memcpy(&desc_len, data + 0x10, sizeof(DTYPE_t))
 
     data_start = \
         <MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y) * <MAXINDEX_t>(num_frames) * 8 + desc_len + 0x12
 
-    fseek(fp, data_start, SEEK_SET)
-    fread(file_buffer, sizeof(char), BUFFER_SIZE, fp)
+    buffer_idx = data_start
     for pix in range(<MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y)):
-        #if pix % num_x == 0:
-        #    print('\rpix done: ' + str(100 * pix / num_x / num_y) + '%...', end='')
+        pix_count = 0
         for trig in range(num_trig):
-            _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x8 * sizeof(char), BUFFER_SIZE)
-            memcpy(&num_pulses, file_buffer + buffer_idx + 0x6, sizeof(time))
+            if buffer_idx + 0x8 > buffer_size:
+                break
+            memcpy(&num_pulses, data + buffer_idx + 0x6, sizeof(time))
             buffer_idx += 0x8
+            if buffer_idx + 0x5 * <MAXINDEX_t>(num_pulses) > buffer_size:
+                buffer_idx = buffer_size
+                break
             p_cnt = 0
             for pulse in range(num_pulses):
-                _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x5 * sizeof(char), BUFFER_SIZE)
-                memcpy(&time, file_buffer + buffer_idx, sizeof(time))
-                memcpy(&width, file_buffer + buffer_idx + 0x2, sizeof(width))
-                memcpy(&intensity, file_buffer + buffer_idx + 0x3, sizeof(intensity))
+                memcpy(&time, data + buffer_idx, sizeof(time))
+                width = data[buffer_idx + 0x2]
+                memcpy(&intensity, data + buffer_idx + 0x3, sizeof(intensity))
                 buffer_idx += 0x5
                 if time <= high_range and time >= low_range:
                     widths[width] += 1
                     intensities[intensity] += 1
                     p_cnt += 1
             if p_cnt != 0:
-                pulse_counts[p_cnt] += 1
-
-    fclose(fp)
-    free(file_buffer)
-
-cdef int _comp(const void *a, const void *b) nogil:
-    cdef int *x = <int *>a
-    cdef int *y = <int *>b
-    return x[0] - y[0]
+                # the last bin collects every trigger with 255 or more pulses in range
+                pulse_counts[p_cnt if p_cnt < 255 else 255] += 1
+                pix_count += p_cnt
+        if pix_count > 0:
+            total_count += pix_count
+            pp_count += 1
+        if buffer_idx + 0x8 > buffer_size:
+            break
+
+    if pp_count > 0:
+        mean_pp[0] = <double>total_count / pp_count
 
-cdef void _extract_pulse_height_and_positive_pixel(const char* filename, DTYPE_t low_range,
-                                                   DTYPE_t high_range,
-                                                   MAXINDEX_t* median_pulse_height,
-                                                   double* mean_pp):
+cdef MAXINDEX_t _extract_total_counts(const char* filename):
+    """ Extract total counts from bin file 
 
+    Args:
+        filename (const char*):
+            Name of bin file to extract
+    """
     cdef DTYPE_t num_x, num_y, num_trig, num_frames, desc_len, trig, num_pulses, pulse, time
     cdef DTYPE_t intensity
-    cdef SMALL_t pulse_count, width
-    cdef MAXINDEX_t data_start, pix, pp_count
-    cdef int idx
+    cdef SMALL_t width
+    cdef MAXINDEX_t data_start, pix, counts
 
     # 10MB buffer
     cdef MAXINDEX_t BUFFER_SIZE = 10 * 1024 * 1024
@@ -274,19 +359,12 @@ cdef void _extract_pulse_height_and_positive_pixel(const char* filename, DTYPE_t
     data_start = \
         <MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y) * <MAXINDEX_t>(num_frames) * 8 + desc_len + 0x12
 
-    # this is technically UB, but it's rare there would be more than 3 pulses per cycle within a
-    # single peak.
-    cdef DTYPE_t* pulse_heights = <DTYPE_t*> malloc(num_x * num_y * num_trig * 3 * sizeof(DTYPE_t))
-    cdef MAXINDEX_t pulse_height_index = 0;
-
     fseek(fp, data_start, SEEK_SET)
     fread(file_buffer, sizeof(char), BUFFER_SIZE, fp)
-    pp_count = 0
+
+    counts = 0
     with nogil:
-        for pix in range(<MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y)): 
-            pulse_count = 0
-            #if pix % num_x == 0:
-            #    print('\rpix done: ' + str(100 * pix / num_x / num_y) + '%...', end='')
+        for pix in range(<MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y)):
             for trig in range(num_trig):
                 _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x8 * sizeof(char), BUFFER_SIZE)
                 memcpy(&num_pulses, file_buffer + buffer_idx + 0x6, sizeof(time))
@@ -297,110 +375,175 @@ cdef void _extract_pulse_height_and_positive_pixel(const char* filename, DTYPE_t
                     memcpy(&width, file_buffer + buffer_idx + 0x2, sizeof(width))
                     memcpy(&intensity, file_buffer + buffer_idx + 0x3, sizeof(intensity))
                     buffer_idx += 0x5
-                    if time <= high_range and time >= low_range:
-                        pulse_heights[pulse_height_index] = intensity
-                        pulse_height_index += 1
-                        pulse_count += 1
-            if pulse_count > 0:
-                mean_pp[0] = (mean_pp[0] * pp_count + pulse_count) / (pp_count+ 1)
-                pp_count += 1
-
-        qsort(pulse_heights, pulse_height_index, sizeof(DTYPE_t), _comp)
-
-        median_pulse_height[0] = pulse_heights[pulse_height_index // 2]
-
+                    counts += 1
     fclose(fp)
     free(file_buffer)
-    free(pulse_heights)
 
+    return counts
 
-cdef MAXINDEX_t _extract_total_counts(const char* filename):
-    """ Extract total counts from bin file 
+def c_read_frame_size(char* filename):
+    cdef DTYPE_t num_x, num_y, num_trig
+    cdef FILE* fp = fopen(filename, "rb")
+    if fp == NULL:
+        raise FileNotFoundError(f"Could not open bin file {filename.decode('utf-8')}")
+    _read_header(fp, &num_x, &num_y, &num_trig)
+    fclose(fp)
+    return int(num_x), int(num_y)
+
+def c_extract_bin(char* filename, DTYPE_t[::1] low_range,
+                  DTYPE_t[::1] high_range, SMALL_t[::1] calc_intensity, out=None):
+    """ Extracts a bin file, optionally into a reusable buffer
 
     Args:
-        filename (const char*):
-            Name of bin file to extract
+        out (np.ndarray | None):
+            C-contiguous uint32 buffer of shape (3, num_x, num_y, len(low_range)).  It is zeroed,
+            filled and returned, so it can be reused across bin files.  Allocated if None.
     """
-    cdef DTYPE_t num_x, num_y, num_trig, num_frames, desc_len, trig, num_pulses, pulse, time
-    cdef DTYPE_t intensity
-    cdef SMALL_t width
-    cdef MAXINDEX_t data_start, pix, counts
+    cdef INT_t[:, :, ::1] out_view
 
-    # 10MB buffer
-    cdef MAXINDEX_t BUFFER_SIZE = 10 * 1024 * 1024
-    cdef char* file_buffer = <char*> malloc(BUFFER_SIZE * sizeof(char))
-    cdef MAXINDEX_t buffer_idx = 0
+    if out is None:
+        return np.asarray(
+            _extract_bin(filename, low_range, high_range, calc_intensity)
+        )
 
-    # open file
-    cdef FILE* fp
-    fp = fopen(filename, "rb")
+    num_x, num_y = c_read_frame_size(filename)
+    shape = (3, num_x, num_y, low_range.shape[0])
+    if out.shape != shape or out.dtype != np.uint32 or not out.flags['C_CONTIGUOUS']:
+        raise ValueError(f'out must be a C-contiguous uint32 array of shape {shape}')
 
-    # note, if cython has packed structs, this would be easier
-    # or even macros tbh
-    fseek(fp, 0x6, SEEK_SET)
-    fread(&num_x, sizeof(DTYPE_t), 1, fp)
-    fread(&num_y, sizeof(DTYPE_t), 1, fp)
-    fread(&num_trig, sizeof(DTYPE_t), 1, fp)
-    fread(&num_frames, sizeof(DTYPE_t), 1, fp)
-    fseek(fp, 0x2, SEEK_CUR)
-    fread(&desc_len, sizeof(DTYPE_t), 1, fp)
+    out_view = out.reshape((3, num_x * num_y, low_range.shape[0]))
+    with nogil:
+        if out_view.shape[1] * out_view.shape[2] > 0:
+            memset(&out_view[0, 0, 0], 0, out_view.shape[0] * out_view.shape[1]
+                   * out_view.shape[2] * sizeof(INT_t))
+        _extract_bin_into(filename, low_range, high_range, calc_intensity, out_view)
 
-    data_start = \
-        <MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y) * <MAXINDEX_t>(num_frames) * 8 + desc_len + 0x12
+    return out
 
-    fseek(fp, data_start, SEEK_SET)
-    fread(file_buffer, sizeof(char), BUFFER_SIZE, fp)
+def c_extract_bin_batch(list filenames, DTYPE_t[:, ::1] low_ranges, DTYPE_t[:, ::1] high_ranges,
+                        SMALL_t[:, ::1] calc_intensities, INT_t[:, :, :, ::1] out):
+    """ Extracts bin files sharing a panel and frame size into one preallocated buffer
 
-    counts = 0
-    for pix in range(<MAXINDEX_t>(num_x) * <MAXINDEX_t>(num_y)):
-        for trig in range(num_trig):
-            _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x8 * sizeof(char), BUFFER_SIZE)
-            memcpy(&num_pulses, file_buffer + buffer_idx + 0x6, sizeof(time))
-            buffer_idx += 0x8
-            for pulse in range(num_pulses):
-                _check_buffer_refill(fp, file_buffer, &buffer_idx, 0x5 * sizeof(char), BUFFER_SIZE)
-                memcpy(&time, file_buffer + buffer_idx, sizeof(time))
-                memcpy(&width, file_buffer + buffer_idx + 0x2, sizeof(width))
-                memcpy(&intensity, file_buffer + buffer_idx + 0x3, sizeof(intensity))
-                buffer_idx += 0x5
-                counts += 1
-    fclose(fp)
-    free(file_buffer)
+    The GIL is released for the whole batch.
 
-    return counts
+    Args:
+        filenames (list[bytes]):
+            Names of bin files to extract
+        low_ranges (uint16_t[:, :]):
+            Starting integration ranges, indexed by (file, target)
+        high_ranges (uint16_t[:, :]):
+            Stoping integration ranges, indexed by (file, target)
+        calc_intensities (uint8_t[:, :]):
+            Intensity extraction flags, indexed by (file, target)
+        out (uint32_t[:, :, :, :]):
+            Zeroed buffer of shape (len(filenames), num_planes, num_x * num_y, num_targets).
+            With 3 planes, pulse counts, intensities and intensity * width are extracted.  With
+            2, intensity * width is skipped.  With 1, intensities replace the pulse counts of
+            targets flagged in `calc_intensities`.
+    """
+    cdef Py_ssize_t i, num_files = len(filenames)
+    cdef const char* filename
 
-def c_extract_bin(char* filename, DTYPE_t[:] low_range,
-                  DTYPE_t[:] high_range, SMALL_t[:] calc_intensity):
-    return np.asarray(
-        _extract_bin(filename, low_range, high_range, calc_intensity)
-    )
+    if not (low_ranges.shape[0] == high_ranges.shape[0] == calc_intensities.shape[0]
+            == out.shape[0] == num_files):
+        raise ValueError('Integration ranges and output buffer must be indexed by bin file')
+    if not (low_ranges.shape[1] == high_ranges.shape[1] == calc_intensities.shape[1]
+            == out.shape[3]) or not 1 <= out.shape[1] <= 3:
+        raise ValueError('Output buffer does not match the number of targets')
+
+    for i in range(num_files):
+        num_x, num_y = c_read_frame_size(filenames[i])
+        if num_x * num_y != out.shape[2]:
+            raise ValueError(f'Output buffer does not match the frame size of {filenames[i]}')
+
+    for i in range(num_files):
+        filename = filenames[i]
+        with nogil:
+            _extract_bin_into(filename, low_ranges[i], high_ranges[i], calc_intensities[i],
+                              out[i])
 
 
 def c_extract_histograms(char* filename, DTYPE_t low_range,
                          DTYPE_t high_range):
-    
+    """ Extracts width, intensity and pulse count histograms from a bin file
+
+    The file is memory mapped, so repeated queries are served from the page cache.
+
+    Returns:
+        tuple:
+            width (256 bins), intensity (65536 bins, one per uint16 value) and pulse count (256
+            bins, the last counting 255 or more pulses) histograms
+    """
+    return c_pulse_stats_and_histograms(filename, low_range, high_range)[1:]
+
+def c_extract_histograms_buf(const unsigned char[::1] buf, DTYPE_t low_range,
+                             DTYPE_t high_range):
+    """ Extracts width, intensity and pulse count histograms from a bin file's contents
+
+    Args:
+        buf (bytes-like):
+            Contents of the bin file, e.g an `mmap.mmap` that is reused across queries
+    """
+    return c_pulse_stats_and_histograms_buf(buf, low_range, high_range)[1:]
+
+def c_pulse_stats_and_histograms(char* filename, DTYPE_t low_range, DTYPE_t high_range):
+    """ Extracts the mean pulses per positive pixel alongside the pulse histograms
+
+    Both come from a single pass over the memory mapped bin file.
+
+    Returns:
+        tuple:
+            mean pulses per positive pixel, followed by the width, intensity and pulse count
+            histograms as returned by `c_extract_histograms`
+
+    Raises:
+        ValueError:
+            If the bin file is empty, as empty files can't be memory mapped
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Bin file {filename.decode('utf-8')} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return c_pulse_stats_and_histograms_buf(mm, low_range, high_range)
+
+def c_pulse_stats_and_histograms_buf(const unsigned char[::1] buf, DTYPE_t low_range,
+                                     DTYPE_t high_range):
+    """ Buffer variant of `c_pulse_stats_and_histograms`, e.g for a reused `mmap.mmap`
+    """
     cdef MAXINDEX_t widths[256]
-    cdef MAXINDEX_t intensity[USHRT_MAX]
+    cdef MAXINDEX_t intensity[USHRT_MAX + 1]
     cdef MAXINDEX_t pulse_counts[256]
+    cdef double mean_pp = 0.0
 
     memset(widths, 0, 256 * sizeof(MAXINDEX_t))
-    memset(intensity, 0, USHRT_MAX * sizeof(MAXINDEX_t))
+    memset(intensity, 0, (USHRT_MAX + 1) * sizeof(MAXINDEX_t))
     memset(pulse_counts, 0, 256 * sizeof(MAXINDEX_t))
 
-    _extract_histograms(filename, low_range, high_range, widths, intensity, pulse_counts)
+    with nogil:
+        _extract_histograms(buf, low_range, high_range, widths, intensity, pulse_counts,
+                            &mean_pp)
 
     return (
+        float(mean_pp),
         np.asarray(widths),
         np.asarray(intensity),
         np.asarray(pulse_counts)
     )
 
 def c_pulse_height_vs_positive_pixel(char* filename, DTYPE_t low_range, DTYPE_t high_range):
-    cdef MAXINDEX_t median_pulse_height = 0
-    cdef double mean_pp = 0.0
-    _extract_pulse_height_and_positive_pixel(filename, low_range, high_range, &median_pulse_height,
-                                             &mean_pp)
-    return int(median_pulse_height), float(mean_pp)
+    """ Gets the median pulse height and mean pulses per positive pixel in one pass
+
+    The median is read off the intensity histogram rather than sorting every pulse height.
+    """
+    mean_pp, _, intensities, _ = c_pulse_stats_and_histograms(filename, low_range, high_range)
+
+    cumulative = np.cumsum(intensities)
+    if cumulative[-1] == 0:
+        return 0, mean_pp
+
+    # upper median, i.e the middle element of the sorted pulse heights
+    median_pulse_height = np.searchsorted(cumulative, cumulative[-1] // 2, side='right')
+    return int(median_pulse_height), mean_pp
 
 def c_total_counts(char* filename):
     counts = _extract_total_counts(filename)
@@ -1,25 +1,33 @@
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
 import os
+import threading
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 import numpy as np
 import pandas as pd
 import xarray as xr
 
-from mibi_bin_tools import io_utils, tiff, type_utils, _extract_bin
+from mibi_bin_tools import tiff, type_utils, zarr_store, _extract_bin
 
 
-def _mass2tof(masses_arr: np.ndarray, mass_offset: float, mass_gain: float,
-              time_res: float) -> np.ndarray:
+def _mass2tof(masses_arr: np.ndarray, mass_offset: Union[float, np.ndarray],
+              mass_gain: Union[float, np.ndarray], time_res: float) -> np.ndarray:
     """Convert array of m/z values to equivalent time of flight values
 
     Args:
         masses_arr (array_like):
             Array of m/z values
-        mass_offset (float):
-            Mass offset for parabolic transformation
-        mass_gain (float):
-            Mass gain for parabolic transformation
+        mass_offset (float | array_like):
+            Mass offset for parabolic transformation.  Arrays broadcast against `masses_arr`.
+        mass_gain (float | array_like):
+            Mass gain for parabolic transformation.  Arrays broadcast against `masses_arr`.
         time_res (float):
             Time resolution for scaling parabolic transformation
 
@@ -27,20 +35,22 @@ def _mass2tof(masses_arr: np.ndarray, mass_offset: float, mass_gain: float,
         array_like:
             Array of time of flight values; indicies paried to `masses_arr`
     """
-    return (mass_gain * np.sqrt(masses_arr) + mass_offset) / time_res
+    # fold time_res into the calibration, so the masses are only traversed three times
+    tofs = np.multiply(np.sqrt(masses_arr, dtype=np.float64), np.divide(mass_gain, time_res))
+    tofs += np.divide(mass_offset, time_res)
+
+    return tofs
 
 
-def _set_tof_ranges(fov: Dict[str, Any], higher: np.ndarray, lower: np.ndarray,
-                    time_res: float) -> None:
-    """Converts and stores provided mass ranges as time of flight ranges within fov metadata
+def _set_tof_ranges(fovs: List[Dict[str, Any]], time_res: float) -> None:
+    """Converts and stores fovs' mass ranges as time of flight ranges within their metadata
+
+    Every fov's range is converted in one broadcast, so the fovs must share `mass_ranges`.
 
     Args:
-        fov (Dict[str, Any]):
-            Metadata for the fov.
-        higher (array_like):
-            Array of m/z values; upper bounds for integration
-        lower (array_like):
-            Array of m/z values; lower bounds for integration
+        fovs (List[Dict[str, Any]]):
+            Metadata for fovs sharing `mass_ranges`, an array of m/z values with shape
+            (2, num_targets) holding upper bounds for integration followed by lower bounds
         time_res (float):
             Time resolution for scaling parabolic transformation
 
@@ -48,20 +58,34 @@ def _set_tof_ranges(fov: Dict[str, Any], higher: np.ndarray, lower: np.ndarray,
         None:
             Fovs argument is modified in place
     """
-    key_names = ('upper_tof_range', 'lower_tof_range')
-    mass_ranges = (higher, lower)
-    wrapping_functions = (np.ceil, np.floor)
+    mass_ranges = fovs[0]['mass_ranges']
+    offsets = np.array([fov['mass_offset'] for fov in fovs], dtype=np.float64)
+    gains = np.array([fov['mass_gain'] for fov in fovs], dtype=np.float64)
+
+    # convert both bounds for all fovs in a single pass
+    tofs = _mass2tof(mass_ranges, offsets[:, np.newaxis, np.newaxis],
+                     gains[:, np.newaxis, np.newaxis], time_res)
+    upper_tof_ranges = np.ceil(tofs[:, 0]).astype(np.uint16)
+    lower_tof_ranges = np.floor(tofs[:, 1]).astype(np.uint16)
+
+    # bin extraction scans ranges in ascending order; targets stay in the panel's order.  tofs
+    # increase with mass, so every fov shares the order of the lower mass bounds
+    tof_order = np.argsort(mass_ranges[1], kind='stable')
 
-    for key, masses, wrap in zip(key_names, mass_ranges, wrapping_functions):
-        fov[key] = \
-            wrap(
-                _mass2tof(masses, fov['mass_offset'], fov['mass_gain'], time_res)
-            ).astype(np.uint16)
+    for fov, upper_tof_range, lower_tof_range in zip(fovs, upper_tof_ranges, lower_tof_ranges):
+        fov['upper_tof_range'] = upper_tof_range
+        fov['lower_tof_range'] = lower_tof_range
+        fov['tof_order'] = tof_order
 
 
 def _write_out(img_data: np.ndarray, out_dir: str, fov_name: str, targets: List[str],
-               intensities: Union[bool, List[str]] = False) -> None:
-    """Parses extracted data and writes out tifs
+               intensities: Union[bool, List[str]] = False,
+               compression: Union[str, None] = 'zstd',
+               compression_level: Union[int, None] = None,
+               multipage: bool = False, output_format: str = 'tiff',
+               executor: Union[ThreadPoolExecutor, None] = None,
+               write_buffer_size: Union[int, None] = None) -> List[Future]:
+    """Parses extracted data and writes out tifs, or arrays to a zarr store
 
     Args:
         img_data (np.ndarray):
@@ -75,6 +99,28 @@ def _write_out(img_data: np.ndarray, out_dir: str, fov_name: str, targets: List[
         intensities (bool | List):
             Whether or not to write out intensity images.  If a List, specific
             peaks can be written out, ignoring the rest, which will only have pulse count images.
+        compression (str | None):
+            Tiff compression; one of 'zstd', 'zlib' or None
+        compression_level (int | None):
+            Compression level.  If None, the codec default is used (4 for zlib, 1 for zstd)
+        multipage (bool):
+            Whether to write one multi-page BigTIFF per image type (`{fov_name}.tiff` and
+            `{fov_name}_intensity.tiff` in `out_dir`), with one page per target, instead of one
+            tif per target within a `fov_name` directory.
+        output_format (str):
+            Either 'tiff' or 'zarr'.  If 'zarr', `out_dir` is a Zarr store (requires zarr) holding
+            one group per fov with one chunked array per target and image type; `compression`
+            then selects the Blosc codec.  `multipage` is ignored.
+        executor (ThreadPoolExecutor | None):
+            Pool to submit the file writes to, e.g one shared across fovs.  If None, a pool is
+            created for this fov's writes.
+        write_buffer_size (int | None):
+            Write buffer size in bytes for tiff output.  If None, tifffile opens the files itself.
+
+    Returns:
+        List[Future]:
+            the submitted writes.  These are only waited on if no executor was given, so
+            `img_data` must be left untouched until they are done.
     """
     out_dirs = [
         os.path.join(out_dir, fov_name),
@@ -89,18 +135,64 @@ def _write_out(img_data: np.ndarray, out_dir: str, fov_name: str, targets: List[
         np.uint32,
     ]
 
+    # only specified intensity targets are written; True writes all of them
+    if type(intensities) is list:
+        intensity_set = set(intensities)
+    else:
+        intensity_set = set(targets) if intensities else set()
+
+    if output_format == 'zarr':
+        fov_group = zarr_store.open_group(out_dir, fov_name)
+    else:
+        write_tiff = partial(tiff.write, buffer_size=write_buffer_size)
+        write_multipage = partial(tiff.write_multipage, buffer_size=write_buffer_size)
+
+    writes = []
     for i, (out_dir_i, suffix, save_dtype) in enumerate(zip(out_dirs, suffixes, save_dtypes)):
         # break loop when index is larger than type dimension of img_data
         if i+1 > img_data.shape[0]:
             break
-        if not os.path.exists(out_dir_i):
-            os.makedirs(out_dir_i)
-        for j, target in enumerate(targets):
-            # save all first images regardless of replacing
-            # if not replace (i=1), only save intensity images for specified targets
-            if i == 0 or (target in list(intensities)):
-                tiff.write_zlib(os.path.join(out_dir_i, f'{target}{suffix}.tiff'),
-                                img_data[i, :, :, j].astype(save_dtype))
+        # save all first images regardless of replacing
+        # if not replace (i=1), only save intensity images for specified targets
+        channels = [
+            (j, target) for j, target in enumerate(targets)
+            if i == 0 or target in intensity_set
+        ]
+        # no intensity targets requested, so don't create an empty directory or file
+        if not channels:
+            continue
+        # only cast the planes being written; views if already at the save dtype
+        planes = [img_data[i, :, :, j].astype(save_dtype, copy=False) for j, _ in channels]
+        if output_format == 'zarr':
+            writes.extend((zarr_store.write, fov_group, f'{target}{suffix}', plane)
+                          for (_, target), plane in zip(channels, planes))
+            continue
+        if multipage:
+            os.makedirs(out_dir, exist_ok=True)
+            writes.append((
+                write_multipage,
+                os.path.join(out_dir, f'{fov_name}{suffix}.tiff'),
+                planes,
+                [target for _, target in channels],
+            ))
+            continue
+        os.makedirs(out_dir_i, exist_ok=True)
+        for (_, target), plane in zip(channels, planes):
+            writes.append((write_tiff, os.path.join(out_dir_i, f'{target}{suffix}.tiff'),
+                           plane))
+
+    # compression releases the GIL, so files are written concurrently
+    if executor is not None:
+        return [executor.submit(*write, compression=compression, level=compression_level)
+                for write in writes]
+
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(*write, compression=compression, level=compression_level)
+                   for write in writes]
+        for future in futures:
+            future.result()
+    return futures
+
 
 def _find_bin_files(data_dir: str,
                     include_fovs: Union[List[str], None] = None) -> Dict[str, Dict[str, str]]:
@@ -116,10 +208,26 @@ def _find_bin_files(data_dir: str,
         Dict[str, Dict[str, str]]:
             Dictionary containing the names of the valid bin files
     """
-    bin_files = io_utils.list_files(data_dir, substrs=['.bin'])
-    json_files = io_utils.list_files(data_dir, substrs=['.json'])
-
-    fov_names = io_utils.extract_delimited_names(bin_files, delimiter='.')
+    if include_fovs is not None:
+        # only check the requested fovs, rather than scanning a possibly large directory
+        fov_names = [
+            fov_name for fov_name in include_fovs
+            if os.path.isfile(os.path.join(data_dir, fov_name + '.bin'))
+            and os.path.isfile(os.path.join(data_dir, fov_name + '.json'))
+        ]
+    else:
+        # classify the directory's files in a single pass
+        bin_names = []
+        json_names = set()
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith('.bin'):
+                    bin_names.append(entry.name[:-4])
+                elif entry.name.endswith('.json'):
+                    json_names.add(entry.name[:-5])
+        fov_names = [fov_name for fov_name in bin_names if fov_name in json_names]
 
     fov_files = {
         fov_name: {
@@ -127,40 +235,74 @@ def _find_bin_files(data_dir: str,
             'json': fov_name + '.json',
         }
         for fov_name in fov_names
-        if fov_name + '.json' in json_files
     }
 
-    if include_fovs is not None:
-        fov_files = {
-            fov_file: fov_files[fov_file]
-            for fov_file in include_fovs
-            if fov_file in fov_files
-        }
-
     if not len(fov_files):
         raise FileNotFoundError(f'No viable bin files were found in {data_dir}...')
 
     return fov_files
 
 
+@lru_cache(maxsize=128)
+def _parse_fov_json(json_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Parses mibiscope json metadata, using orjson when available
+
+    Memoized on the file's modification time and size, so edited files are parsed again.
+
+    Args:
+        json_path (str):
+            Path to the fov's json metadata file
+        mtime_ns (int):
+            Modification time of the file, in nanoseconds
+        size (int):
+            Size of the file, in bytes
+
+    Returns:
+        Dict[str, Any]:
+            parsed json metadata
+    """
+    with open(json_path, 'rb') as f:
+        if orjson is not None:
+            return orjson.loads(f.read())
+        return json.load(f)
+
+
+def _read_fov_json(json_path: str) -> Dict[str, Any]:
+    """Reads mibiscope json metadata, reusing the parse of an unchanged file
+
+    Interactive QC re-reads the same fov's metadata for every channel, so parses are cached.
+
+    Args:
+        json_path (str | PathLike):
+            Path to the fov's json metadata file
+
+    Returns:
+        Dict[str, Any]:
+            parsed json metadata.  This is shared between calls and must not be modified.
+    """
+    stat = os.stat(json_path)
+    return _parse_fov_json(os.fspath(json_path), stat.st_mtime_ns, stat.st_size)
+
+
 def _fill_fov_metadata(data_dir: str, fov: Dict[str, Any],
-                       panel: Union[Tuple[float, float], pd.DataFrame],
+                       panel: Union[Tuple[float, float], pd.DataFrame, Dict[str, Any]],
                        intensities: Union[bool, List[str]], time_res: float,
                        channels: List[str] = None) -> None:
     """ Parses user input and mibiscope json to build extraction parameters
 
     Fills fov metadata with mass calibration parameters, builds panel, and sets intensity
-    extraction flags.
+    extraction flags.  `_fill_fovs_metadata` does the same for many fovs at once.
 
     Args:
         data_dir (str):
             Directory containing bin files as well as accompanying json metadata files
         fov (Dict[str, Any]):
             Metadata for the fov.
-        panel (tuple | pd.DataFrame):
+        panel (tuple | pd.DataFrame | Dict[str, Any]):
             If a tuple, global integration range over all antibodies within json metadata.
             If a pd.DataFrame, specific peaks with custom integration ranges.  Column names must be
             'Mass' and 'Target' with integration ranges specified via 'Start' and 'Stop' columns.
+            Custom panels may also be prepared ahead of time via `_prepare_df_panel`.
         intensities (bool | List[str]):
             Whether or not to extract intensity and intensity * width images.  If a List, specific
             peaks can be extracted, ignoring the rest, which will only have pulse count images
@@ -173,23 +315,79 @@ def _fill_fov_metadata(data_dir: str, fov: Dict[str, Any],
         None:
             `fov` argument is modified in place
     """
+    _parse_fov_panel(data_dir, fov, panel, channels)
+    _set_tof_ranges([fov], time_res)
+    _parse_intensities(fov, intensities)
+
+
+def _fill_fovs_metadata(data_dir: str, fovs: Iterable[Dict[str, Any]],
+                        panel: Union[Tuple[float, float], pd.DataFrame, Dict[str, Any]],
+                        intensities: Union[bool, List[str]], time_res: float) -> None:
+    """ Runs `_fill_fov_metadata` over many fovs, converting shared mass ranges together
+
+    Fovs usually share their panel, so each distinct set of mass ranges is converted to time of
+    flight ranges in a single broadcast over the fovs' mass calibrations.
+
+    Args:
+        data_dir (str):
+            Directory containing bin files as well as accompanying json metadata files
+        fovs (Iterable[Dict[str, Any]]):
+            Metadata for each fov
+        panel (tuple | pd.DataFrame | Dict[str, Any]):
+            Panel, as for `_fill_fov_metadata`
+        intensities (bool | List[str]):
+            Whether or not to extract intensity and intensity * width images.  If a List, specific
+            peaks can be extracted, ignoring the rest, which will only have pulse count images
+            extracted.
+        time_res (float):
+            Time resolution for scaling parabolic transformation
+    Returns:
+        None:
+            `fovs` are modified in place
+    """
+    panel_groups = {}
+    for fov in fovs:
+        _parse_fov_panel(data_dir, fov, panel)
+        mass_ranges = fov['mass_ranges']
+        panel_key = (mass_ranges.shape, mass_ranges.tobytes())
+        panel_groups.setdefault(panel_key, []).append(fov)
+        _parse_intensities(fov, intensities)
+
+    for panel_fovs in panel_groups.values():
+        _set_tof_ranges(panel_fovs, time_res)
 
-    with open(os.path.join(data_dir, fov['json']), 'rb') as f:
-        data = json.load(f)
+
+def _parse_fov_panel(data_dir: str, fov: Dict[str, Any],
+                     panel: Union[Tuple[float, float], pd.DataFrame, Dict[str, Any]],
+                     channels: List[str] = None) -> None:
+    """ Reads a fov's mass calibration and builds its panel's mass ranges
+
+    Args:
+        data_dir (str):
+            Directory containing bin files as well as accompanying json metadata files
+        fov (Dict[str, Any]):
+            Metadata for the fov.
+        panel (tuple | pd.DataFrame | Dict[str, Any]):
+            Panel, as for `_fill_fov_metadata`
+        channels (List[str] | None):
+            Filters panel for given channels.  All channels in panel extracted if None
+    Returns:
+        None:
+            `fov` argument is modified in place
+    """
+    data = _read_fov_json(os.path.join(data_dir, fov['json']))
 
     fov['mass_gain'] = data['fov']['fullTiming']['massCalibration']['massGain']
     fov['mass_offset'] = data['fov']['fullTiming']['massCalibration']['massOffset']
 
     if type(panel) is tuple:
-        _parse_global_panel(data, fov, panel, time_res, channels)
+        _parse_global_panel(data, fov, panel, channels)
     else:
-        _parse_df_panel(fov, panel, time_res, channels)
-
-    _parse_intensities(fov, intensities)
+        _parse_df_panel(fov, panel, channels)
 
 
 def _parse_global_panel(json_metadata: dict, fov: Dict[str, Any], panel: Tuple[float, float],
-                        time_res: float, channels: List[str]) -> None:
+                        channels: List[str]) -> None:
     """Extracts panel contained in mibiscope json metadata
 
     Args:
@@ -201,8 +399,6 @@ def _parse_global_panel(json_metadata: dict, fov: Dict[str, Any], panel: Tuple[f
             Global integration range over all antibodies within json metadata.
             Column names must 'Mass' and 'Target' with integration ranges specified via 'Start' and
             'Stop' columns.
-        time_res (float):
-            Time resolution for scaling parabolic transformation
         channels (List[str] | None):
             Filters panel for given channels.  All channels in panel extracted if None
     Returns:
@@ -215,39 +411,68 @@ def _parse_global_panel(json_metadata: dict, fov: Dict[str, Any], panel: Tuple[f
             + "If this is a moly point, you must manually supply a panel..."
         )
     rows = json_metadata['fov']['panel']['conjugates']
-    fov['masses'], fov['targets'] = zip(*[
-        (el['mass'], el['target'])
-        for el in rows
-        if channels is None or el['target'] in channels
-    ])
+    if channels is not None:
+        channel_set = set(channels)
+        rows = [el for el in rows if el['target'] in channel_set]
 
-    masses_arr = np.array(fov['masses'])
-    _set_tof_ranges(fov, masses_arr + panel[1], masses_arr + panel[0], time_res)
+    masses_arr = np.fromiter((el['mass'] for el in rows), dtype=np.float64, count=len(rows))
+    fov['masses'] = masses_arr
+    fov['targets'] = tuple(el['target'] for el in rows)
 
+    # build both bounds straight into one array
+    fov['mass_ranges'] = np.add.outer((panel[1], panel[0]), masses_arr)
 
-def _parse_df_panel(fov: Dict[str, Any], panel: pd.DataFrame, time_res: float,
-                    channels: List[str]) -> None:
-    """Converts masses from panel into times for fov extraction-metadata structure
+
+def _prepare_df_panel(panel: pd.DataFrame, channels: List[str] = None) -> Dict[str, Any]:
+    """Filters a custom panel and converts its columns to arrays, once for all fovs
 
     Args:
-        fov (Dict[str, Any]):
-            Metadata for the fov.
         panel (pd.DataFrame):
             Specific peaks with custom integration ranges.  Column names must be 'Mass' and
             'Target' with integration ranges specified via 'Start' and 'Stop' columns.
-        time_res (float):
-            Time resolution for scaling parabolic transformation
         channels (List[str] | None):
             Filters panel for given channels.  All channels in panel extracted if None
+    Returns:
+        Dict[str, Any]:
+            panel masses, targets and (2, num_targets) 'Stop'/'Start' mass ranges
+    """
+    # without channels every row is kept, so skip the self-filter; a set hashes the lookup
+    if channels is None:
+        rows = panel
+    else:
+        rows = panel.loc[panel['Target'].isin(set(channels))]
+
+    return {
+        'masses': np.ascontiguousarray(rows['Mass'].values, dtype=np.float64),
+        'targets': tuple(rows['Target']),
+        'mass_ranges': rows[['Stop', 'Start']].to_numpy(dtype=np.float64).T,
+    }
+
+
+def _parse_df_panel(fov: Dict[str, Any], panel: Union[pd.DataFrame, Dict[str, Any]],
+                    channels: List[str]) -> None:
+    """Stores masses and integration ranges from panel in the fov extraction-metadata structure
+
+    Args:
+        fov (Dict[str, Any]):
+            Metadata for the fov.
+        panel (pd.DataFrame | Dict[str, Any]):
+            Specific peaks with custom integration ranges.  Column names must be 'Mass' and
+            'Target' with integration ranges specified via 'Start' and 'Stop' columns.  May
+            also be a panel already prepared (and filtered) by `_prepare_df_panel`.
+        channels (List[str] | None):
+            Filters panel for given channels.  All channels in panel extracted if None.
+            Ignored for prepared panels.
     Returns:
         None:
             `fov` argument is modified in place
     """
-    rows = panel.loc[panel['Target'].isin(panel['Target'] if channels is None else channels)]
-    fov['masses'] = rows['Mass']
-    fov['targets'] = rows['Target']
+    if type(panel) is not dict:
+        panel = _prepare_df_panel(panel, channels)
 
-    _set_tof_ranges(fov, rows['Stop'].values, rows['Start'].values, time_res)
+    fov['masses'] = panel['masses']
+    fov['targets'] = panel['targets']
+    fov['mass_ranges'] = panel['mass_ranges']
 
 
 def _parse_intensities(fov: Dict[str, Any], intensities: Union[bool, List[str]]) -> None:
@@ -265,17 +490,18 @@ def _parse_intensities(fov: Dict[str, Any], intensities: Union[bool, List[str]])
             `fov` argument is modified in place
     """
 
-    filtered_intensities = None
+    # order the 'calc_intensity' flags, stored as uint8 as bin extraction expects
+    num_targets = len(fov['targets'])
     if type(intensities) is list:
-        filtered_intensities = [target for target in fov['targets'] if target in intensities]
+        intensity_set = frozenset(intensities)
+        fov['calc_intensity'] = np.fromiter(
+            (target in intensity_set for target in fov['targets']),
+            dtype=np.uint8, count=num_targets
+        )
     elif intensities is True:
-        filtered_intensities = fov['targets']
-
-    # order the 'calc_intensity' bools
-    if filtered_intensities is not None:
-        fov['calc_intensity'] = [target in list(filtered_intensities) for target in fov['targets']]
+        fov['calc_intensity'] = np.ones(num_targets, dtype=np.uint8)
     else:
-        fov['calc_intensity'] = [False, ] * len(fov['targets'])
+        fov['calc_intensity'] = np.zeros(num_targets, dtype=np.uint8)
 
 
 def condense_img_data(img_data, targets, intensities, replace):
@@ -296,30 +522,422 @@ def condense_img_data(img_data, targets, intensities, replace):
         altered img_data according to args
 
     """
+    extract_intensities = type_utils.any_true(intensities)
+
     # extracting intensity and replacing
-    if type_utils.any_true(intensities) and replace:
-        for j, target in enumerate(targets):
-            # replace only specified targets
-            if target in intensities:
-                img_data[0, :, :, j] = img_data[1, :, :, j]
-        img_data = img_data[[0], :, :, :]
+    if extract_intensities and replace:
+        # replace only specified targets, in a single masked copy
+        intensity_set = set(intensities)
+        replace_mask = np.fromiter((target in intensity_set for target in targets),
+                                   dtype=bool, count=len(targets))
+        img_data[0, ..., replace_mask] = img_data[1, ..., replace_mask]
+        img_data = img_data[0:1]
 
     # not extracting intensity
-    elif not type_utils.any_true(intensities):
-        img_data = img_data[[0], :, :, :]
+    elif not extract_intensities:
+        img_data = img_data[0:1]
 
     # extracting intensity but not replacing
     else:
-        img_data = img_data[[0, 1], :, :, :]
+        img_data = img_data[0:2]
 
     return img_data
 
 
+def _gather_extraction_arrays(fovs: List[Dict[str, Any]]) -> Tuple[Sequence[np.ndarray], ...]:
+    """Gathers the per-fov extraction parameters into struct-of-arrays form
+
+    Parameters are sorted by lower tof range, as bin extraction requires, so extracted channels
+    follow each fov's `tof_order` until restored by `_restore_channel_order`.
+
+    Args:
+        fovs (List[Dict[str, Any]]):
+            Metadata for each fov, as filled by `_fill_fov_metadata`
+
+    Returns:
+        Tuple[Sequence[np.ndarray], ...]:
+            lower tof ranges (uint16), upper tof ranges (uint16) and intensity flags (uint8),
+            each indexed by fov.  These are 2D arrays when every fov has the same number of
+            targets, otherwise lists of 1D arrays.
+    """
+    # metadata is already stored at the extraction dtypes, so only the tof sort copies
+    keys = ('lower_tof_range', 'upper_tof_range', 'calc_intensity')
+    arrays = tuple([fov[key][fov['tof_order']] for fov in fovs] for key in keys)
+
+    if len({len(fov['targets']) for fov in fovs}) == 1:
+        arrays = tuple(np.stack(fov_arrays) for fov_arrays in arrays)
+
+    return arrays
+
+
+def _restore_channel_order(img_data: np.ndarray, tof_order: np.ndarray) -> np.ndarray:
+    """Reorders channels extracted in tof order back into panel order
+
+    Args:
+        img_data (np.ndarray):
+            Extracted image data, with channels along the last axis in tof order
+        tof_order (np.ndarray):
+            Permutation sorting the panel's targets by lower tof range
+
+    Returns:
+        np.ndarray:
+            `img_data` itself if the panel is already sorted, otherwise a reordered copy
+    """
+    if np.all(tof_order[1:] > tof_order[:-1]):
+        return img_data
+    return img_data[..., np.argsort(tof_order)]
+
+
+class _ScratchPool:
+    """Reusable extraction buffers shared by all fov threads, bounded by a global count
+
+    A buffer is taken before a fov is extracted and only given back once the writes reading from
+    it are done, so a fov can be extracted while earlier fovs' writes are still flushing, but no
+    more than `max_buffers` fovs are held in memory however many threads extract or write.
+
+    Buffers are kept flat and handed out as a contiguous view of their leading elements, so fovs
+    with smaller frames or fewer targets than an earlier fov reuse the existing allocation.
+
+    Args:
+        max_buffers (int):
+            Maximum number of buffers alive at once
+    """
+
+    def __init__(self, max_buffers: int):
+        self._slots = threading.BoundedSemaphore(max_buffers)
+        self._lock = threading.Lock()
+        self._free: List[np.ndarray] = []
+
+    def take(self, bf: str, num_targets: int) -> np.ndarray:
+        """Gets a buffer for the given bin file, waiting for one to be given back if needed
+
+        Args:
+            bf (str | PathLike):
+                Path to the bin file about to be extracted
+            num_targets (int):
+                Number of targets to be extracted
+
+        Returns:
+            np.ndarray:
+                uint32 buffer of shape (3, num_x, num_y, num_targets)
+        """
+        num_x, num_y = _extract_bin.c_read_frame_size(bytes(bf, 'utf-8'))
+        shape = (3, num_x, num_y, num_targets)
+        size = int(np.prod(shape))
+
+        self._slots.acquire()
+        with self._lock:
+            sizes = [flat.size for flat in self._free]
+            fitting = [i for i, flat_size in enumerate(sizes) if flat_size >= size]
+            if fitting:
+                flat = self._free.pop(min(fitting, key=sizes.__getitem__))
+            else:
+                # a free buffer that is too small is dropped, so each slot holds one buffer
+                if self._free:
+                    self._free.pop()
+                flat = None
+        if flat is None:
+            flat = np.empty(size, dtype=np.uint32)
+
+        return flat[:size].reshape(shape)
+
+    def give_back(self, buffer: np.ndarray, futures: Sequence[Future] = ()) -> None:
+        """Returns a buffer to the pool once the writes reading from it are done
+
+        Args:
+            buffer (np.ndarray):
+                Buffer handed out by `take`
+            futures (Sequence[Future]):
+                Writes reading from the buffer
+        """
+        flat = buffer.base
+        pending = set(futures)
+
+        def _release(future: Union[Future, None] = None) -> None:
+            with self._lock:
+                pending.discard(future)
+                if pending:
+                    return
+                self._free.append(flat)
+            self._slots.release()
+
+        if not pending:
+            _release()
+        for future in futures:
+            future.add_done_callback(_release)
+
+    def clear(self) -> None:
+        """Drops the buffers that have been given back, e.g once a run is done
+        """
+        with self._lock:
+            self._free.clear()
+
+
+def _extract_fov(fov: Dict[str, Any], bf: str, lower_tof_range: np.ndarray,
+                 upper_tof_range: np.ndarray, calc_intensity: np.ndarray,
+                 out_dir: Union[str, None], intensities: Union[bool, List[str]], replace: bool,
+                 compression: Union[str, None] = 'zstd',
+                 compression_level: Union[int, None] = None,
+                 multipage: bool = False,
+                 scratch: Union[_ScratchPool, None] = None,
+                 output_format: str = 'tiff',
+                 write_executor: Union[ThreadPoolExecutor, None] = None,
+                 write_buffer_size: Union[int, None] = None
+                 ) -> Union[xr.DataArray, List[Future]]:
+    """Extracts a single fov's bin file and either writes out tifs or builds an xarray
+
+    Args:
+        fov (Dict[str, Any]):
+            Metadata for the fov, as filled by `_fill_fov_metadata`
+        bf (str | PathLike):
+            Path to the fov's bin file
+        lower_tof_range (np.ndarray):
+            Lower time of flight integration bounds per target in tof order, as uint16
+        upper_tof_range (np.ndarray):
+            Upper time of flight integration bounds per target in tof order, as uint16
+        calc_intensity (np.ndarray):
+            Intensity extraction flags per target in tof order, as uint8
+        out_dir (str | PathLike | None):
+            Directory to save the tiffs in.  If None, image data is returned as an xarray.
+        intensities (bool | List):
+            Whether or not to extract intensity images.  If a List, specific
+            peaks can be extracted, ignoring the rest, which will only have pulse count images
+            extracted.
+        replace (bool):
+            Whether to replace pulse images with intensity images.
+        compression (str | None):
+            Tiff compression; one of 'zstd', 'zlib' or None
+        compression_level (int | None):
+            Compression level.  If None, the codec default is used (4 for zlib, 1 for zstd)
+        multipage (bool):
+            Whether to write one multi-page tiff per image type instead of one tif per target
+        scratch (_ScratchPool | None):
+            Pool of reusable extraction buffers.  Only safe to use when writing out, since the
+            returned image data would otherwise alias the buffer.
+        output_format (str):
+            Either 'tiff' or 'zarr' (requires zarr)
+        write_executor (ThreadPoolExecutor | None):
+            Pool to submit file writes to.  If given, writes are not waited on before returning.
+            If None, a pool is created per fov.
+        write_buffer_size (int | None):
+            Write buffer size in bytes for tiff output.  If None, tifffile opens the files itself.
+
+    Returns:
+        xr.DataArray | List[Future]:
+            image data if no out_dir is provided, otherwise the fov's submitted writes
+    """
+    out = None
+    if scratch is not None:
+        out = scratch.take(bf, len(lower_tof_range))
+
+    try:
+        img_data = _extract_bin.c_extract_bin(
+            bytes(bf, 'utf-8'), lower_tof_range, upper_tof_range, calc_intensity, out
+        )
+        img_data = _restore_channel_order(img_data, fov['tof_order'])
+
+        # any_true scans list intensities, so only evaluate it once per fov
+        extract_intensities = type_utils.any_true(intensities)
+
+        # convert intensities=True to list of all targets
+        if extract_intensities and type(intensities) is not list:
+            intensities = list(fov['targets'])
+
+        img_data = condense_img_data(img_data, list(fov['targets']), intensities, replace)
+
+        if out_dir is not None:
+            futures = _write_out(
+                img_data,
+                out_dir,
+                fov['bin'][:-4],
+                fov['targets'],
+                intensities,
+                compression,
+                compression_level,
+                multipage,
+                output_format,
+                write_executor,
+                write_buffer_size
+            )
+    except BaseException:
+        # other fovs may be waiting on the buffer
+        if out is not None:
+            scratch.give_back(out)
+        raise
+
+    if out_dir is not None:
+        if out is not None:
+            # the buffer is handed out again once these writes are done
+            scratch.give_back(out, futures)
+        return futures
+
+    if replace or not extract_intensities:
+        type_list = ['pulse']
+    else:
+        type_list = ['pulse', 'intensities']
+
+    return xr.DataArray(
+        data=img_data[np.newaxis, :],
+        coords=[
+            [fov['bin'].split('.')[0]],
+            type_list,
+            np.arange(img_data.shape[1]),
+            np.arange(img_data.shape[2]),
+            list(fov['targets']),
+        ],
+        dims=['fov', 'type', 'x', 'y', 'channel'],
+    )
+
+
+def _stack_fovs(fov_arrays: Iterable[xr.DataArray], fov_names: List[str]) -> xr.DataArray:
+    """Stacks single fov image data into one DataArray, as each fov's data becomes available
+
+    The output is preallocated from the first fov, so each fov's data can be released as soon as
+    it is copied in, rather than holding every fov and their concatenation at once.  Falls back to
+    `xr.concat` if fovs differ in shape or coordinates.
+
+    Args:
+        fov_arrays (Iterable[xr.DataArray]):
+            Image data for each fov, as built by `_extract_fov`
+        fov_names (List[str]):
+            Names of the fovs, paired with `fov_arrays`
+
+    Returns:
+        xr.DataArray:
+            image data for all fovs, with dims ['fov', 'type', 'x', 'y', 'channel']
+    """
+    fov_arrays = iter(fov_arrays)
+    first = next(fov_arrays)
+
+    image_data = xr.DataArray(
+        data=np.empty((len(fov_names), *first.shape[1:]), dtype=first.dtype),
+        coords=[fov_names] + [first.indexes[dim] for dim in first.dims[1:]],
+        dims=first.dims,
+    )
+    image_data.values[0] = first.values[0]
+
+    for i, fov_array in enumerate(fov_arrays, start=1):
+        if not all(fov_array.indexes[dim].equals(first.indexes[dim]) for dim in first.dims[1:]):
+            # mismatched fovs can't share the buffer, so let xarray align them
+            return xr.concat([image_data[:i], fov_array, *fov_arrays], dim='fov')
+        image_data.values[i] = fov_array.values[0]
+
+    return image_data
+
+
+def _is_batchable(fovs: List[Dict[str, Any]], bin_files: List[str],
+                  lower_tof_ranges: Sequence[np.ndarray]) -> bool:
+    """Checks whether fovs share targets, tof order and frame size, and can be extracted as one
+    batch
+
+    Args:
+        fovs (List[Dict[str, Any]]):
+            Metadata for each fov, as filled by `_fill_fov_metadata`
+        bin_files (List[str]):
+            Paths to each fov's bin file
+        lower_tof_ranges (Sequence[np.ndarray]):
+            Lower tof ranges, as gathered by `_gather_extraction_arrays`
+
+    Returns:
+        bool:
+            whether `_extract_fov_batch` can be used
+    """
+    if not isinstance(lower_tof_ranges, np.ndarray):
+        return False
+    if len({tuple(fov['targets']) for fov in fovs}) != 1:
+        return False
+    if len({tuple(fov['tof_order']) for fov in fovs}) != 1:
+        return False
+    frame_sizes = {_extract_bin.c_read_frame_size(bytes(bf, 'utf-8')) for bf in bin_files}
+    return len(frame_sizes) == 1
+
+
+def _extract_fov_batch(fovs: List[Dict[str, Any]], bin_files: List[str],
+                       lower_tof_ranges: np.ndarray, upper_tof_ranges: np.ndarray,
+                       calc_intensities: np.ndarray, intensities: Union[bool, List[str]],
+                       replace: bool, maxworkers: int) -> xr.DataArray:
+    """Extracts fovs sharing targets and frame size directly into one preallocated array
+
+    Fovs are split into contiguous chunks, each extracted by a single `c_extract_bin_batch` call
+    on a worker thread, so no per-fov image buffers are allocated or copied.
+
+    Args:
+        fovs (List[Dict[str, Any]]):
+            Metadata for each fov, as filled by `_fill_fov_metadata`
+        bin_files (List[str]):
+            Paths to each fov's bin file
+        lower_tof_ranges (np.ndarray):
+            Lower tof ranges, indexed by (fov, target) with targets in tof order
+        upper_tof_ranges (np.ndarray):
+            Upper tof ranges, indexed by (fov, target) with targets in tof order
+        calc_intensities (np.ndarray):
+            Intensity extraction flags, indexed by (fov, target) with targets in tof order
+        intensities (bool | List):
+            Whether or not to extract intensity images.  If a List, specific
+            peaks can be extracted, ignoring the rest, which will only have pulse count images
+            extracted.
+        replace (bool):
+            Whether to replace pulse images with intensity images.
+        maxworkers (int):
+            Maximum number of threads used to extract fovs concurrently
+
+    Returns:
+        xr.DataArray:
+            image data for all fovs, with dims ['fov', 'type', 'x', 'y', 'channel']
+    """
+    targets = list(fovs[0]['targets'])
+    num_x, num_y = _extract_bin.c_read_frame_size(bytes(bin_files[0], 'utf-8'))
+
+    # only the kept types are extracted.  a single plane holds the requested intensities in place
+    # of their pulse counts, as `condense_img_data` would with replace
+    if type_utils.any_true(intensities) and not replace:
+        type_list = ['pulse', 'intensities']
+    else:
+        type_list = ['pulse']
+
+    img_data = np.zeros((len(fovs), len(type_list), num_x, num_y, len(targets)), dtype=np.uint32)
+    flat_img_data = img_data.reshape((len(fovs), len(type_list), num_x * num_y, len(targets)))
+    bin_names = [bytes(bf, 'utf-8') for bf in bin_files]
+
+    def _extract_chunk(chunk: slice) -> None:
+        _extract_bin.c_extract_bin_batch(
+            bin_names[chunk], lower_tof_ranges[chunk], upper_tof_ranges[chunk],
+            calc_intensities[chunk], flat_img_data[chunk]
+        )
+
+    bounds = np.linspace(0, len(fovs), min(maxworkers, len(fovs)) + 1).astype(int)
+    with ThreadPoolExecutor(max_workers=maxworkers) as executor:
+        for _ in executor.map(_extract_chunk, map(slice, bounds[:-1], bounds[1:])):
+            pass
+
+    # channels are restored to panel order one fov at a time, so only a single fov is copied
+    for fov_img_data in img_data:
+        restored = _restore_channel_order(fov_img_data, fovs[0]['tof_order'])
+        if restored is not fov_img_data:
+            fov_img_data[...] = restored
+
+    return xr.DataArray(
+        data=img_data,
+        coords=[
+            [fov['bin'].split('.')[0] for fov in fovs],
+            type_list,
+            np.arange(num_x),
+            np.arange(num_y),
+            targets,
+        ],
+        dims=['fov', 'type', 'x', 'y', 'channel'],
+    )
+
+
 def extract_bin_files(data_dir: str, out_dir: Union[str, None],
                       include_fovs: Union[List[str], None] = None,
                       panel: Union[Tuple[float, float], pd.DataFrame] = (-0.3, 0.0),
                       intensities: Union[bool, List[str]] = False, replace=True,
-                      time_res: float = 500e-6):
+                      time_res: float = 500e-6, maxworkers: Union[int, None] = None,
+                      compression: Union[str, None] = 'zstd',
+                      compression_level: Union[int, None] = None, multipage: bool = False,
+                      output_format: str = 'tiff',
+                      write_buffer_size: Union[int, None] = tiff.WRITE_BUFFER_SIZE):
     """Converts MibiScope bin files to pulse count, intensity, and intensity * width tiff images
 
     Args:
@@ -341,65 +959,92 @@ def extract_bin_files(data_dir: str, out_dir: Union[str, None],
             Whether to replace pulse images with intensity images.
         time_res (float):
             Time resolution for scaling parabolic transformation
+        maxworkers (int | None):
+            Maximum number of threads used to extract and write fovs concurrently.
+            If None, up to 4 threads are used.  Each fov being extracted holds a uint32 buffer
+            of 3 x frame size x targets, e.g ~2 GB for 2048 x 2048 pixels and 40 targets, so
+            only raise it as far as memory allows.  When writing out, at most `maxworkers + 1`
+            buffers are alive at once, one more than the threads so that a fov's writes can
+            flush while the next fovs are extracted.
+        compression (str | None):
+            Tiff compression; one of 'zstd', 'zlib' or None.  'zstd' with horizontal
+            differencing writes considerably faster than 'zlib' at a similar file size, but
+            needs a zstd-capable reader (e.g tifffile with imagecodecs, or recent Bio-Formats).
+            Use 'zlib' for readers limited to baseline codecs, such as ImageJ's own.
+        compression_level (int | None):
+            Compression level.  If None, the codec default is used (4 for zlib, 1 for zstd).
+            Raise it (e.g 6 or 9 for zlib) when writing archival data.
+        multipage (bool):
+            Whether to write one multi-page BigTIFF per fov and image type, with pages named after
+            their targets, instead of one tif per target.  Avoids per-file overhead for large
+            panels.
+        output_format (str):
+            Either 'tiff' or 'zarr'.  If 'zarr', `out_dir` is written as a Zarr store (requires
+            zarr) with one group per fov and one chunked, Blosc-compressed array per target,
+            which suits downstream analysis in Python better than many small tiffs.
+        write_buffer_size (int | None):
+            Write buffer size in bytes for tiff output, 2 MiB by default.  Output on network
+            filesystems (SMB/NFS) is sensitive to it, so tune it there.  If None, tifffile opens
+            the files itself.
     Returns:
         None | np.ndarray:
             image data if no out_dir is provided, otherwise no return
     """
 
-    fov_files = _find_bin_files(data_dir, include_fovs)
-
-    for fov in fov_files.values():
-        _fill_fov_metadata(data_dir, fov, panel, intensities, time_res)
-
-    bin_files = \
-        [(fov, os.path.join(data_dir, fov['bin'])) for fov in fov_files.values()]
-
-    image_data = []
-
-    for i, (fov, bf) in enumerate(bin_files):
-        img_data = _extract_bin.c_extract_bin(
-            bytes(bf, 'utf-8'), fov['lower_tof_range'],
-            fov['upper_tof_range'], np.array(fov['calc_intensity'], dtype=np.uint8)
-        )
-
-        # convert intensities=True to list of all targets
-        if type_utils.any_true(intensities):
-            if type(intensities) is not list:
-                intensities = list(fov['targets'])
-
-        img_data = condense_img_data(img_data, list(fov['targets']), intensities, replace)
+    if output_format not in ('tiff', 'zarr'):
+        raise ValueError(f"output_format must be 'tiff' or 'zarr', not {output_format!r}")
+    if output_format == 'zarr' and out_dir is not None:
+        # create the root group before fov workers open their groups within it
+        zarr_store.open_root(out_dir)
 
-        if out_dir is not None:
-            _write_out(
-                img_data,
-                out_dir,
-                fov['bin'][:-4],
-                fov['targets'],
-                intensities
-            )
-        else:
-            if replace or not type_utils.any_true(intensities):
-                type_list = ['pulse']
-            else:
-                type_list = ['pulse', 'intensities']
-            image_data.append(
-                xr.DataArray(
-                    data=img_data[np.newaxis, :],
-                    coords=[
-                        [fov['bin'].split('.')[0]],
-                        type_list,
-                        np.arange(img_data.shape[1]),
-                        np.arange(img_data.shape[2]),
-                        list(fov['targets']),
-                    ],
-                    dims=['fov', 'type', 'x', 'y', 'channel'],
-                )
-            )
-
-    if out_dir is None:
-        image_data = xr.concat(image_data, dim='fov')
+    fov_files = _find_bin_files(data_dir, include_fovs)
 
-        return image_data
+    # custom panels are the same for every fov, so only convert them once
+    if type(panel) is not tuple:
+        panel = _prepare_df_panel(panel)
+
+    _fill_fovs_metadata(data_dir, fov_files.values(), panel, intensities, time_res)
+
+    fovs = list(fov_files.values())
+    bin_files = [os.path.join(data_dir, fov['bin']) for fov in fovs]
+    lower_tof_ranges, upper_tof_ranges, calc_intensities = _gather_extraction_arrays(fovs)
+
+    # every fov in flight holds its own image buffer, so the default is kept small
+    maxworkers = maxworkers or min(4, os.cpu_count())
+
+    # fovs sharing a panel and frame size are extracted straight into one array
+    if out_dir is None and _is_batchable(fovs, bin_files, lower_tof_ranges):
+        return _extract_fov_batch(fovs, bin_files, lower_tof_ranges, upper_tof_ranges,
+                                  calc_intensities, intensities, replace, maxworkers)
+
+    # bin extraction releases the GIL, so fovs can be processed on threads.  file writes from
+    # all fovs go to one shared pool, which flushes a fov while the threads extract the next ones
+    # into the remaining buffers
+    scratch = _ScratchPool(maxworkers + 1) if out_dir is not None else None
+    try:
+        with ThreadPoolExecutor(max_workers=maxworkers) as executor, \
+                ThreadPoolExecutor(max_workers=maxworkers) as write_executor:
+            extract_fov = partial(_extract_fov, out_dir=out_dir, intensities=intensities,
+                                  replace=replace, compression=compression,
+                                  compression_level=compression_level, multipage=multipage,
+                                  scratch=scratch, output_format=output_format,
+                                  write_executor=write_executor,
+                                  write_buffer_size=write_buffer_size)
+            fov_arrays = executor.map(extract_fov, fovs, bin_files, lower_tof_ranges,
+                                      upper_tof_ranges, calc_intensities)
+
+            if out_dir is None:
+                fov_names = [fov['bin'].split('.')[0] for fov in fovs]
+                return _stack_fovs(fov_arrays, fov_names)
+
+            # wait on every write to surface any worker exceptions
+            for futures in fov_arrays:
+                for future in futures:
+                    future.result()
+    finally:
+        # the pool outlives the run if e.g a traceback holds on to it, so free its buffers now
+        if scratch is not None:
+            scratch.clear()
 
 
 def get_histograms_per_tof(data_dir: str, fov: str, channel: str, mass_range=(-0.3, 0.0),
@@ -418,6 +1063,12 @@ def get_histograms_per_tof(data_dir: str, fov: str, channel: str, mass_range=(-0
             Integration range
         time_res (float):
             Time resolution for scaling parabolic transformation
+
+    Returns:
+        tuple:
+            width (256 bins), intensity (65536 bins, one per uint16 value, so the last one counts
+            pulses of intensity 65535) and pulse count (256 bins, the last counting triggers with
+            255 or more pulses) histograms
     """
     fov = _find_bin_files(data_dir, [fov])[fov]
 
@@ -460,13 +1111,23 @@ def get_median_pulse_height(data_dir: str, fov: str, channel: str,
                                           fov['lower_tof_range'][0],
                                           fov['upper_tof_range'][0])
 
-    int_bin = np.cumsum(intensities) / intensities.sum()
-    median_height = (np.abs(int_bin - 0.5)).argmin()
+    # the cumulative counts are sorted, so the height whose count is closest to half the total
+    # starts one of the two plateaus around a binary search, rather than needing a full argmin
+    int_bin = np.cumsum(intensities)
+    if int_bin[-1] == 0:
+        return 0
+    idx = np.searchsorted(int_bin, 0.5 * int_bin[-1])
+    candidates = [idx] if idx == 0 else [np.searchsorted(int_bin, int_bin[idx - 1]), idx]
+
+    # argmin keeps the first, i.e lower, height on equidistant ties
+    distances = np.abs(int_bin[candidates] / int_bin[-1] - 0.5)
+    median_height = int(candidates[distances.argmin()])
 
     return median_height
 
 
-def get_total_counts(data_dir: str, include_fovs: Union[List[str], None] = None):
+def get_total_counts(data_dir: str, include_fovs: Union[List[str], None] = None,
+                     maxworkers: Union[int, None] = None):
     """Retrieves total counts for each field of view
 
     Args:
@@ -474,6 +1135,9 @@ def get_total_counts(data_dir: str, include_fovs: Union[List[str], None] = None)
             Directory containing bin files as well as accompanying json metadata files
         include_fovs (List | None):
             List of fovs to include.  Includes all if None.
+        maxworkers (int | None):
+            Maximum number of threads used to count fovs concurrently.
+            If None, up to `os.cpu_count()` threads are used.
 
     Returns:
         dict:
@@ -483,8 +1147,10 @@ def get_total_counts(data_dir: str, include_fovs: Union[List[str], None] = None)
     fov_files = _find_bin_files(data_dir, include_fovs)
 
     bin_files = \
-        [(name, os.path.join(data_dir, fov['bin'])) for name, fov in fov_files.items()]
+        [bytes(os.path.join(data_dir, fov['bin']), 'utf-8') for fov in fov_files.values()]
 
-    outs = {name: _extract_bin.c_total_counts(bytes(bf, 'utf-8')) for name, bf in bin_files}
+    # counting releases the GIL, so fovs can be counted on threads
+    with ThreadPoolExecutor(max_workers=maxworkers or os.cpu_count()) as executor:
+        outs = dict(zip(fov_files.keys(), executor.map(_extract_bin.c_total_counts, bin_files)))
 
     return outs
@@ -1,8 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 import os
+import time
 import warnings
 
+import numpy as np
 
-def list_files(dir_name, substrs=None, exact_match=False):
+# directories modified this recently may change again without a new mtime, as file system
+# timestamps are coarser than a single modification
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def _strip_extension(name):
+    """ Removes a file name's extension, matching `os.path.splitext(name)[0]`
+
+    Bare names not starting with a period take a single `rfind`; paths, dotfiles and path-like
+    objects go through `os.path.splitext`.
+
+    Args:
+        name (str):
+            File name or path
+
+    Returns:
+        str:
+            name without its extension
+    """
+    if type(name) is not str or name.startswith('.') or '/' in name or os.sep in name:
+        return os.path.splitext(name)[0]
+    # a non-period first character means any later period starts an extension
+    dot = name.rfind('.')
+    return name[:dot] if dot > 0 else name
+
+
+@lru_cache(maxsize=32)
+def _scan_dir(dir_name, mtime_ns):
+    """ Lists a directory's entries, cached per directory modification time
+
+    Args:
+        dir_name (str):
+            Absolute path of the directory
+        mtime_ns (int):
+            Modification time of the directory, only used to invalidate the cache
+
+    Returns:
+        tuple:
+            (name, is_dir) pairs of the directory's entries
+    """
+    # scandir reports entry types from the directory listing, so entries aren't stat-ed one by one
+    with os.scandir(dir_name) as entries:
+        return tuple((entry.name, entry.is_dir()) for entry in entries)
+
+
+def clear_listing_cache():
+    """ Forgets all cached directory listings of `list_files` and `list_folders`
+
+    Listings are only cached for callers passing `cache=True`, and are keyed by the directory's
+    modification time, which some file systems (e.g NFS with attribute caching, or FAT's 2 s
+    resolution) don't update reliably.  Clear the cache after changing such a directory.
+    """
+    _scan_dir.cache_clear()
+
+
+def _list_dir(dir_name, cache=False):
+    """ Lists a directory's entries, optionally reusing the previous listing if it is unchanged
+
+    Args:
+        dir_name (str):
+            Directory to list
+        cache (bool):
+            If True, reuse the previous listing of a settled, unchanged directory
+
+    Returns:
+        tuple:
+            (name, is_dir) pairs of the directory's entries
+    """
+    if cache:
+        mtime_ns = os.stat(dir_name).st_mtime_ns
+        # recently modified directories are listed afresh, like git's racily clean index entries
+        if time.time_ns() - mtime_ns >= _RACY_WINDOW_NS:
+            return _scan_dir(os.path.abspath(dir_name), mtime_ns)
+    return _scan_dir.__wrapped__(dir_name, None)
+
+
+def list_files(dir_name, substrs=None, exact_match=False, cache=False):
     """ List all files in a directory containing at least one given substring
 
     Args:
@@ -13,14 +93,17 @@ def list_files(dir_name, substrs=None, exact_match=False):
         exact_match (bool):
             If True, will match exact file names (so 'C' will match only 'C.tif')
             If False, will match substr pattern in file (so 'C' will match 'C.tif' and 'CD30.tif')
+        cache (bool):
+            If True, reuse the listing of a directory whose modification time is unchanged and
+            more than 2 s old.  Off by default, as directory times can lag behind changes, e.g
+            on NFS with attribute caching.  See `clear_listing_cache`.
 
     Returns:
         list:
             List of files containing at least one of the substrings
     """
 
-    files = os.listdir(dir_name)
-    files = [file for file in files if not os.path.isdir(os.path.join(dir_name, file))]
+    files = [name for name, is_dir in _list_dir(dir_name, cache) if not is_dir]
 
     # default to return all files
     if substrs is None:
@@ -31,23 +114,141 @@ def list_files(dir_name, substrs=None, exact_match=False):
         substrs = [substrs]
 
     if exact_match:
-        matches = [file
-                   for file in files
-                   if any([
-                        substr == os.path.splitext(file)[0]
-                        for substr in substrs
-                   ])]
+        # exact names are a single hash lookup per file
+        substr_set = set(substrs)
+        matches = [file for file in files if os.path.splitext(file)[0] in substr_set]
     else:
-        matches = [file
-                   for file in files
-                   if any([
-                       substr in file
-                       for substr in substrs
-                   ])]
+        # stop at the first matching substring
+        matches = [file for file in files if any(substr in file for substr in substrs)]
 
     return matches
 
 
+def list_file_stats(dir_name, substrs=None, exact_match=False):
+    """ List the matching files of a directory along with their sizes and modification times
+
+    Names, sizes and times are gathered in a single scandir pass and returned as arrays, so they
+    can be filtered or sorted with NumPy instead of stat-ing each file again.  Directories are
+    always listed afresh, as cached listings carry no sizes or times.
+
+    Args:
+        dir_name (str):
+            Parent directory for files of interest
+        substrs (str or list):
+            Substring matching criteria, defaults to None (all files)
+        exact_match (bool):
+            If True, will match exact file names (so 'C' will match only 'C.tif')
+            If False, will match substr pattern in file (so 'C' will match 'C.tif' and 'CD30.tif')
+
+    Returns:
+        dict:
+            'name' (object), 'size' (int64, bytes) and 'mtime' (int64, ns) arrays, paired by
+            index
+    """
+    # handle case where substrs is a single string (not wrapped in list)
+    if substrs is not None and type(substrs) is not list:
+        substrs = [substrs]
+    substr_set = set(substrs) if substrs is not None and exact_match else None
+
+    names, sizes, mtimes = [], [], []
+    with os.scandir(dir_name) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                continue
+            if substr_set is not None:
+                if os.path.splitext(entry.name)[0] not in substr_set:
+                    continue
+            elif substrs is not None and not any(substr in entry.name for substr in substrs):
+                continue
+            # DirEntry.stat is free on Windows, and a single call per file elsewhere.  entries
+            # that can't be stat-ed, e.g broken symlinks, are skipped
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            names.append(entry.name)
+            sizes.append(st.st_size)
+            mtimes.append(st.st_mtime_ns)
+
+    name_array = np.empty(len(names), dtype=object)
+    name_array[:] = names
+    return {
+        'name': name_array,
+        'size': np.array(sizes, dtype=np.int64),
+        'mtime': np.array(mtimes, dtype=np.int64),
+    }
+
+
+def list_files_many(dir_names, substrs=None, exact_match=False, maxworkers=None, cache=False):
+    """ List files containing at least one given substring in each of several directories
+
+    Directory scans release the GIL, so the directories are listed on threads.  This overlaps
+    latency on network file systems; on local disks the gain is small, but so is the cost.
+
+    Args:
+        dir_names (list):
+            Parent directories for files of interest
+        substrs (str or list):
+            Substring matching criteria, defaults to None (all files)
+        exact_match (bool):
+            If True, will match exact file names (so 'C' will match only 'C.tif')
+            If False, will match substr pattern in file (so 'C' will match 'C.tif' and 'CD30.tif')
+        maxworkers (int | None):
+            Maximum number of threads used to list directories concurrently.
+            If None, up to 32 threads are used.
+        cache (bool):
+            If True, reuse the listing of a directory whose modification time is unchanged and
+            more than 2 s old.  Off by default, as directory times can lag behind changes, e.g
+            on NFS with attribute caching.  See `clear_listing_cache`.
+
+    Returns:
+        list:
+            Lists of matching files, in the order of `dir_names`
+    """
+    if not dir_names:
+        return []
+
+    list_dir_files = partial(list_files, substrs=substrs, exact_match=exact_match, cache=cache)
+    with ThreadPoolExecutor(max_workers=maxworkers or min(32, len(dir_names))) as executor:
+        return list(executor.map(list_dir_files, dir_names))
+
+
+def walk_files(top, substrs=None):
+    """ Recursively yields the files below a directory containing at least one given substring
+
+    Where supported, the tree is walked with `os.fwalk`, which lists each directory through an
+    open file descriptor, so files can be opened relative to it without resolving their full
+    path again.  Elsewhere, e.g on Windows, full paths are yielded with a `None` descriptor.
+    Either way, `os.open(name, flags, dir_fd=dir_fd)` opens the file.
+
+    Args:
+        top (str):
+            Root directory of the tree
+        substrs (str or list):
+            Substring matching criteria, defaults to None (all files)
+
+    Yields:
+        tuple:
+            (dir_fd, name) of each matching file.  `dir_fd` is only valid until the next file is
+            requested.
+    """
+    # handle case where substrs is a single string (not wrapped in list)
+    if substrs is not None and type(substrs) is not list:
+        substrs = [substrs]
+
+    if hasattr(os, 'fwalk') and os.open in os.supports_dir_fd:
+        for _, _, files, dir_fd in os.fwalk(top):
+            for file in files:
+                if substrs is None or any(substr in file for substr in substrs):
+                    yield dir_fd, file
+        return
+
+    for dir_path, _, files in os.walk(top):
+        for file in files:
+            if substrs is None or any(substr in file for substr in substrs):
+                yield None, os.path.join(dir_path, file)
+
+
 def remove_file_extensions(files):
     """Removes file extensions from a list of files
 
@@ -70,7 +271,7 @@ def remove_file_extensions(files):
         return
 
     # remove the file extension
-    names = [os.path.splitext(name)[0] for name in files]
+    names = [_strip_extension(name) for name in files]
 
     # identify names with '.' in them: these may not be processed correctly
     bad_names = [name for name in names if '.' in name]
@@ -127,13 +328,47 @@ def extract_delimited_names(names, delimiter='_', delimiter_optional=True):
 
             return None
 
-    # now split on the delimiter as well
-    names = [name.split(delimiter)[0] for name in names]
+    # now split on the delimiter as well; partition stops at the first delimiter
+    if delimiter is None:
+        names = [name.split(delimiter)[0] for name in names]
+    else:
+        names = [name.partition(delimiter)[0] for name in names]
 
     return names
 
 
-def list_folders(dir_name, substrs=None):
+def iter_delimited_names(dir_name, substrs=None, exact_match=False, delimiter='_'):
+    """ Yields the delimited prefixes of a directory's files, e.g. fov names
+
+    Equivalent to chaining `list_files`, `remove_file_extensions` and `extract_delimited_names`,
+    but each name is processed once, without building the intermediate lists.  Unlike
+    `remove_file_extensions`, names still containing a period are not warned about.
+
+    Args:
+        dir_name (str):
+            Parent directory for files of interest
+        substrs (str or list):
+            Substring matching criteria, defaults to None (all files)
+        exact_match (bool):
+            If True, will match exact file names (so 'C' will match only 'C.tif')
+            If False, will match substr pattern in file (so 'C' will match 'C.tif' and 'CD30.tif')
+        delimiter (str):
+            Character separator used to determine filename prefix. Defaults to '_'.
+            If None, splits on whitespace.
+
+    Yields:
+        str:
+            Extension-less, delimited prefix of each matching file
+    """
+    for file in list_files(dir_name, substrs, exact_match):
+        name = _strip_extension(file)
+        if delimiter is None:
+            yield name.split(delimiter)[0]
+        else:
+            yield name.partition(delimiter)[0]
+
+
+def list_folders(dir_name, substrs=None, cache=False):
     """ List all folders in a directory containing at least one given substring
 
     Args:
@@ -141,13 +376,16 @@ def list_folders(dir_name, substrs=None):
             Parent directory for folders of interest
         substrs (str or list):
             Substring matching criteria, defaults to None (all folders)
+        cache (bool):
+            If True, reuse the listing of a directory whose modification time is unchanged and
+            more than 2 s old.  Off by default, as directory times can lag behind changes, e.g
+            on NFS with attribute caching.  See `clear_listing_cache`.
 
     Returns:
         list:
             List of folders containing at least one of the substrings
     """
-    files = os.listdir(dir_name)
-    folders = [file for file in files if os.path.isdir(os.path.join(dir_name, file))]
+    folders = [name for name, is_dir in _list_dir(dir_name, cache) if is_dir]
 
     # default to return all files
     if substrs is None:
@@ -157,11 +395,6 @@ def list_folders(dir_name, substrs=None):
     if type(substrs) is not list:
         substrs = [substrs]
 
-    matches = [folder
-               for folder in folders
-               if any([
-                   substr in folder
-                   for substr in substrs
-               ])]
+    matches = [folder for folder in folders if any(substr in folder for substr in substrs)]
 
     return matches
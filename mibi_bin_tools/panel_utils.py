@@ -1,14 +1,47 @@
-from typing import Union, List
+from typing import Iterable, Union, List
+import numpy as np
 import pandas as pd
 
 from mibi_bin_tools.type_utils import make_iterable
 
 
+def make_panels(masses: Iterable[float], target_names: Iterable[str],
+                low_range: Union[float, Iterable[float]] = 0.3,
+                high_range: Union[float, Iterable[float]] = 0.0) -> pd.DataFrame:
+    """ Creates a multi mass panel in a single DataFrame construction
+
+    Integration bounds are computed for all masses at once, with scalar ranges broadcast over
+    every mass.  Targets are stored as a categorical column, so comparisons and grouping by
+    target work on integer codes.
+
+    Args:
+        masses (Iterable[float]):
+            central m/z per signal
+        target_names (Iterable[str]):
+            naming per target
+        low_range (float | Iterable[float]):
+            units below central mass to start integration, per mass or for all masses
+        high_range (float | Iterable[float]):
+            units above central mass to stop integration, per mass or for all masses
+
+    Returns:
+        pd.DataFrame:
+            mass panel as pandas dataframe
+    """
+    masses = np.asarray(masses, dtype=np.float64)
+    return pd.DataFrame({
+        'Mass': masses,
+        'Target': pd.Categorical(list(target_names)),
+        'Start': masses - np.asarray(low_range, dtype=np.float64),
+        'Stop': masses + np.asarray(high_range, dtype=np.float64),
+    }, copy=False)
+
+
 def make_panel(mass: Union[float, List[float]],
                target_name: Union[str, List[str], None] = None,
                low_range: Union[float, List[float]] = 0.3,
                high_range: Union[float, List[float]] = 0.0) -> pd.DataFrame:
-    """ Creates single mass panel
+    """ Creates single mass panel, validating arguments before deferring to `make_panels`
 
     Args:
         mass (float | List[float]):
@@ -46,21 +79,4 @@ def make_panel(mass: Union[float, List[float]],
                     'be set to float values, e.g `low_range=0.3`'
                 )
 
-    low_range = make_iterable(low_range)
-    high_range = make_iterable(high_range)
-
-    if len(low_range) != len(mass):
-        low_range = low_range * len(mass)
-    if len(high_range) != len(mass):
-        high_range = high_range * len(mass)
-
-    rows = []
-    for m, ch, low, high in zip(mass, target_name, low_range, high_range):
-        rows.append({
-            'Mass': m,
-            'Target': ch,
-            'Start': m - low,
-            'Stop': m + high,
-        })
-
-    return pd.DataFrame(rows)
+    return make_panels(mass, target_name, low_range, high_range)
@@ -1,17 +1,116 @@
 import tifffile as tiff
 
+# default compression level per supported codec; None writes uncompressed
+DEFAULT_LEVELS = {
+    'zlib': 4,
+    'zstd': 1,
+    None: None,
+}
 
-def write_zlib(file, data, level=8):
+# TIFF PageName tag
+PAGE_NAME_TAG = 285
+
+# suggested write buffer for output on network filesystems (SMB/NFS), where small writes are slow
+WRITE_BUFFER_SIZE = 2 * 1024 * 1024
+
+
+def _compression_args(compression='zlib', level=None):
+    """
+    Builds tifffile write arguments for the requested compression.
+
+    Parameters:
+        compression:    one of 'zlib', 'zstd' or None (uncompressed)
+        level:          compression level, or None for the codec's default
+
+    Returns:
+        dict:   keyword arguments for `tifffile.imwrite` or `tifffile.TiffWriter.write`
+    """
+    if compression not in DEFAULT_LEVELS:
+        raise ValueError(
+            f'Unsupported compression {compression!r}; must be one of {list(DEFAULT_LEVELS)}'
+        )
+    if compression is None:
+        return {}
+
+    args = {
+        'compression': compression,
+        'compressionargs': {
+            'level': int(DEFAULT_LEVELS[compression] if level is None else level)
+        },
+    }
+    # TIFF has no byte-shuffle filter; horizontal differencing is the closest predictor
+    if compression == 'zstd':
+        args['predictor'] = True
+    return args
+
+
+def _imwrite(file, data, buffer_size=None, **kwargs):
+    """
+    Writes image data via `tifffile.imwrite`, optionally through a buffered file handle.
+
+    Parameters:
+        file:           string or path-like object
+        data:           NumPy or bytes array
+        buffer_size:    write buffer size in bytes, or None for tifffile's own file handling
+        kwargs:         further arguments for `tifffile.imwrite`
+    """
+    if buffer_size is None:
+        tiff.imwrite(file, data, **kwargs)
+        return
+    with open(file, 'wb', buffering=buffer_size) as fh:
+        tiff.imwrite(fh, data, **kwargs)
+
+
+def write_zlib(file, data, level=4):
     """
     Writes image data to a zlib-compressed TIFF file.
-    See: https://github.com/cgohlke/tifffile/blob/master/tifffile/tifffile.py
 
     Parameters:
         file:   string or path-like object
         data:   NumPy or bytes array
         level:  compression level (1=minimum, 9=maximum)
     """
-    tiff.imwrite(file,
-                 data,
-                 compression='zlib',
-                 compressionargs={'level': int(level)})
+    tiff.imwrite(file, data, **_compression_args('zlib', level))
+
+
+def write(file, data, compression='zlib', level=None, buffer_size=None):
+    """
+    Writes image data to a TIFF file using the requested compression.
+
+    Parameters:
+        file:           string or path-like object
+        data:           NumPy or bytes array
+        compression:    one of 'zlib', 'zstd' or None (uncompressed)
+        level:          compression level, or None for the codec's default.
+                        Ignored if uncompressed.
+        buffer_size:    write buffer size in bytes, or None for tifffile's own file handling
+    """
+    _imwrite(file, data, buffer_size, **_compression_args(compression, level))
+
+
+def write_multipage(file, pages, page_names, compression='zlib', level=None, buffer_size=None):
+    """
+    Writes a sequence of 2D images as the pages of a single BigTIFF file.
+    Each page is tagged with its name via the PageName tag.
+
+    Parameters:
+        file:           string or path-like object
+        pages:          iterable of 2D NumPy arrays
+        page_names:     iterable of page names, paired with `pages`
+        compression:    one of 'zlib', 'zstd' or None (uncompressed)
+        level:          compression level, or None for the codec's default.
+                        Ignored if uncompressed.
+        buffer_size:    write buffer size in bytes, or None for tifffile's own file handling
+    """
+    write_args = _compression_args(compression, level)
+    fh = file if buffer_size is None else open(file, 'wb', buffering=buffer_size)
+    try:
+        with tiff.TiffWriter(fh, bigtiff=True) as tif:
+            for page, page_name in zip(pages, page_names):
+                tif.write(page, photometric='minisblack', metadata=None,
+                          description=str(page_name),
+                          extratags=[(PAGE_NAME_TAG, 's', 0, str(page_name), True)],
+                          **write_args)
+    finally:
+        if fh is not file:
+            fh.close()
@@ -1,5 +1,10 @@
 from typing import Union, Iterable
 
+import numpy as np
+
+# common non-iterable types, resolved by a single isinstance check
+_SCALARS = (int, float, bool, np.floating, np.integer, type(None))
+
 
 def any_true(a: Union[bool, Iterable[bool]]) -> bool:
     """ `any` that allows singleton values
@@ -12,11 +17,14 @@ def any_true(a: Union[bool, Iterable[bool]]) -> bool:
         bool:
             whether any true values where found
     """
-    return any(make_iterable(a))
+    # singleton bools are returned without going through the iterator protocol
+    if a is True or a is False:
+        return a
+    return any(a) if hasattr(a, '__iter__') else bool(a)
 
 
 def make_iterable(a: Union[type, Iterable[type]], ignore_str=True) -> Iterable[type]:
-    """ Convert noniterable type to singelton in list
+    """ Convert noniterable type to singelton in tuple
 
     Args:
         a (T | Iterable[T]):
@@ -25,7 +33,11 @@ def make_iterable(a: Union[type, Iterable[type]], ignore_str=True) -> Iterable[t
             whether to ignore the iterability of the str type
 
     Returns:
-        List[T]:
-            a as singleton in list, or a if a was already iterable.
+        Tuple[T] | Iterable[T]:
+            a as singleton in tuple, or a if a was already iterable.
     """
-    return a if hasattr(a, '__iter__') and not (isinstance(a, str) and ignore_str) else [a]
+    if isinstance(a, _SCALARS):
+        return (a,)
+    if ignore_str and isinstance(a, str):
+        return (a,)
+    return a if hasattr(a, '__iter__') else (a,)
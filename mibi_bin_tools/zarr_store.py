@@ -0,0 +1,86 @@
+import threading
+
+try:
+    import zarr
+    from numcodecs import Blosc
+except ImportError:
+    zarr = None
+    Blosc = None
+
+from mibi_bin_tools.tiff import DEFAULT_LEVELS
+
+# chunk edge length; 256x256 uint32 chunks are 256 KiB uncompressed
+CHUNK_SIZE = 256
+
+# concurrent first opens of a new store race to create its root group
+_ROOT_LOCK = threading.Lock()
+
+
+def require_zarr():
+    """
+    Raises an ImportError if the optional zarr dependency is missing.
+    """
+    if zarr is None:
+        raise ImportError(
+            "Zarr output requires the 'zarr' package; "
+            "install it with `pip install mibi-bin-tools[zarr]`"
+        )
+
+
+def open_root(store):
+    """
+    Opens (or creates) the root group of a Zarr directory store.
+    Safe to call from several threads at once; the root group is only created by one of them.
+
+    Parameters:
+        store:  string or path-like object of the store's root directory
+
+    Returns:
+        zarr.hierarchy.Group:   the store's root group
+    """
+    require_zarr()
+    with _ROOT_LOCK:
+        return zarr.open_group(str(store), mode='a')
+
+
+def open_group(store, name):
+    """
+    Opens (or creates) a named group within a Zarr directory store.
+
+    Parameters:
+        store:  string or path-like object of the store's root directory
+        name:   name of the group, e.g. a fov name
+
+    Returns:
+        zarr.hierarchy.Group:   the requested group
+    """
+    return open_root(store).require_group(name)
+
+
+def write(group, name, data, compression='zstd', level=None):
+    """
+    Writes a 2D image to a chunked, Blosc-compressed Zarr array within `group`.
+    Blosc's byte shuffle is applied ahead of the codec, which suits sparse uint32 counts.
+    An existing array of the same name is overwritten.
+
+    Parameters:
+        group:          zarr group to write into
+        name:           name of the array, e.g. a target name
+        data:           2D NumPy array
+        compression:    Blosc codec; one of 'zstd', 'zlib' or None (uncompressed)
+        level:          compression level, or None for the codec's default.
+                        Ignored if uncompressed.
+    """
+    if compression not in DEFAULT_LEVELS:
+        raise ValueError(
+            f'Unsupported compression {compression!r}; must be one of {list(DEFAULT_LEVELS)}'
+        )
+    compressor = None
+    if compression is not None:
+        compressor = Blosc(
+            cname=compression,
+            clevel=int(DEFAULT_LEVELS[compression] if level is None else level),
+            shuffle=Blosc.SHUFFLE,
+        )
+    group.create_dataset(name, data=data, chunks=(CHUNK_SIZE, CHUNK_SIZE),
+                         compressor=compressor, overwrite=True)
@@ -49,7 +49,10 @@ setup(
         'tests': ['pytest',
                   'pytest-cov',
                   'pytest-pycodestyle',
-                  'testbook']
+                  'testbook',
+                  'zarr>=2.11,<3'],
+        'zarr': ['zarr>=2.11,<3'],
+        'json': ['orjson>=3.6']
     },
     long_description=long_description,
     long_description_content_type='text/markdown',
@@ -2,24 +2,44 @@ from pytest_cases import (
     parametrize, parametrize_with_cases, fixture, case
 )
 import pytest
+import inspect
 from typing import Dict, Tuple
 import os
+import json
 from pathlib import Path
+import shutil
 import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import numpy as np
 import pandas as pd
+import tifffile
+import xarray as xr
 
-from mibi_bin_tools import bin_files, io_utils, type_utils, _extract_bin
+from mibi_bin_tools import bin_files, io_utils, type_utils, zarr_store, _extract_bin
 
 THIS_DIR = Path(__file__).parent
 
 TEST_DATA_DIR = THIS_DIR / 'data'
 
+TEST_DIRS = {name: os.path.join(TEST_DATA_DIR, name) for name in ('tissue', 'moly')}
+
+
+@fixture(scope='session')
+def tissue_fov_files():
+    # discovered once per session; tests must copy the fov dicts before filling them
+    return bin_files._find_bin_files(TEST_DIRS['tissue'])
+
+
+def _copy_fovs(fov_files):
+    return {fov_name: dict(fov) for fov_name, fov in fov_files.items()}
+
 
 class FovMetadataTestFiles:
 
     def _generic(self, parent_folder):
-        return os.path.join(TEST_DATA_DIR, parent_folder), {
+        return TEST_DIRS[parent_folder], {
             'json': 'fov-1-scan-1.json',
             'bin': 'fov-1-scan-1.bin',
         }
@@ -33,6 +53,22 @@ class FovMetadataTestFiles:
         return self._generic('moly')
 
 
+# panels are only read, never modified, so every case shares the same frames
+SMA_PANEL = pd.DataFrame({
+    'Mass': [89],
+    'Target': ['SMA'],
+    'Start': [88.7],
+    'Stop': [89.0],
+})
+
+BAD_SMA_PANEL = pd.DataFrame({
+    'isotope': [89],
+    'antibody': ['SMA'],
+    'start': [88.7],
+    'stop': [89],
+})
+
+
 class FovMetadataTestPanels:
 
     @case(tags=['global'])
@@ -41,24 +77,12 @@ class FovMetadataTestPanels:
 
     @case(tags=['specified'])
     def case_specified_panel(self):
-        panel = pd.DataFrame([{
-            'Mass': 89,
-            'Target': 'SMA',
-            'Start': 88.7,
-            'Stop': 89.0,
-        }])
-        return panel
+        return SMA_PANEL
 
     @case(tags=['specified'])
     @pytest.mark.xfail(raises=KeyError, strict=True)
     def case_bad_specified_panel(self):
-        bad_panel = pd.DataFrame([{
-            'isotope': 89,
-            'antibody': 'SMA',
-            'start': 88.7,
-            'stop': 89,
-        }])
-        return bad_panel
+        return BAD_SMA_PANEL
 
 
 class FovMetadataTestChannels:
@@ -101,26 +125,39 @@ def filepath_checks():
         '_intensity',
     ]
 
+    dir_suffixes = list(zip(inner_dir_names, suffix_names))
+
     def _filepath_checks(out_dir, fov_name, targets, intensities, replace):
-        assert (os.path.exists(os.path.join(out_dir, fov_name)))
+        fov_dir = os.path.join(out_dir, fov_name)
+        assert (os.path.isdir(fov_dir))
 
         if type_utils.any_true(intensities):
             if type(intensities) is not list:
                 intensities = targets
 
-        for i, (inner_name, suffix) in enumerate(zip(inner_dir_names, suffix_names)):
-            inner_dir = os.path.join(out_dir, fov_name, inner_name)
+        # walk the written layout once, then compare it against the expected one in memory
+        written_dirs, written_tifs = set(), set()
+        for root, dirs, files in os.walk(fov_dir):
+            rel_root = os.path.relpath(root, fov_dir)
+            written_dirs.update(os.path.normpath(os.path.join(rel_root, d)) for d in dirs)
+            written_tifs.update(os.path.normpath(os.path.join(rel_root, f)) for f in files)
+
+        expected_dirs, expected_tifs = set(), set()
+        for i, (inner_name, suffix) in enumerate(dir_suffixes):
             made_intensity_folder = i < 1 or (i == 1 and intensities and not replace)
-            if made_intensity_folder:
-                assert (os.path.exists(inner_dir))
-                for target in targets:
-                    tif_path = os.path.join(inner_dir, f'{target}{suffix}.tiff')
-                    if i < 1 or (i == 1 and target in intensities):
-                        assert (os.path.exists(tif_path))
-                    else:
-                        assert (not os.path.exists(tif_path))
-            else:
-                assert (not os.path.exists(inner_dir))
+            if not made_intensity_folder:
+                continue
+            if inner_name:
+                expected_dirs.add(inner_name)
+            # pulse tifs are written for every target, intensity tifs only for requested ones
+            written_targets = targets if i < 1 else [t for t in targets if t in intensities]
+            expected_tifs.update(
+                os.path.normpath(os.path.join(inner_name, f'{target}{suffix}.tiff'))
+                for target in written_targets
+            )
+
+        assert (written_dirs == expected_dirs)
+        assert (written_tifs == expected_tifs)
 
     return _filepath_checks
 
@@ -148,6 +185,83 @@ def test_write_out(filepath_checks):
         bin_files._write_out(img_data_ext, tmpdir, fov_name, targets, intensities=intensities)
         filepath_checks(tmpdir, fov_name, targets, intensities=intensities, replace=False)
 
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # no intensity directory for an empty intensity list
+        bin_files._write_out(img_data_ext, tmpdir, fov_name, targets, intensities=[])
+        filepath_checks(tmpdir, fov_name, targets, intensities=[], replace=False)
+
+    img_data_counts = np.random.randint(0, 100, size=img_data_ext.shape).astype(np.uint32)
+    for compression in ('zlib', 'zstd', None):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # correct write out and readback for each compression
+            bin_files._write_out(img_data_counts, tmpdir, fov_name, targets,
+                                 intensities=intensities, compression=compression)
+            filepath_checks(tmpdir, fov_name, targets, intensities=intensities, replace=False)
+            readback = tifffile.imread(os.path.join(tmpdir, fov_name, f'{targets[0]}.tiff'))
+            assert (np.array_equal(readback, img_data_counts[0, :, :, 0]))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # correct write out with explicit compression level
+        bin_files._write_out(img_data_counts, tmpdir, fov_name, targets,
+                             intensities=intensities, compression='zlib', compression_level=9)
+        readback = tifffile.imread(os.path.join(tmpdir, fov_name, f'{targets[0]}.tiff'))
+        assert (np.array_equal(readback, img_data_counts[0, :, :, 0]))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # correct multipage write out, one page per written target
+        bin_files._write_out(img_data_counts, tmpdir, fov_name, targets,
+                             intensities=intensities, multipage=True)
+        assert (not os.path.exists(os.path.join(tmpdir, fov_name)))
+        with tifffile.TiffFile(os.path.join(tmpdir, f'{fov_name}.tiff')) as tif:
+            assert ([page.description for page in tif.pages] == targets)
+            assert (np.array_equal(tif.asarray(), np.moveaxis(img_data_counts[0], -1, 0)))
+        with tifffile.TiffFile(os.path.join(tmpdir, f'{fov_name}_intensity.tiff')) as tif:
+            assert ([page.description for page in tif.pages] == intensities)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # disk-backed image data is written straight from its memory map
+        img_data_mmap = np.memmap(os.path.join(tmpdir, 'img_data.dat'), dtype=np.uint32,
+                                  mode='w+', shape=img_data_counts.shape)
+        img_data_mmap[...] = img_data_counts
+        bin_files._write_out(img_data_mmap, tmpdir, fov_name, targets, intensities=intensities)
+        filepath_checks(tmpdir, fov_name, targets, intensities=intensities, replace=False)
+        readback = tifffile.imread(os.path.join(tmpdir, fov_name, f'{targets[-1]}.tiff'))
+        assert (np.array_equal(readback, img_data_counts[0, :, :, -1]))
+        del img_data_mmap
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # correct single and multipage write out through buffered file handles
+        bin_files._write_out(img_data_counts, tmpdir, fov_name, targets,
+                             intensities=intensities, write_buffer_size=1024)
+        readback = tifffile.imread(os.path.join(tmpdir, fov_name, f'{targets[0]}.tiff'))
+        assert (np.array_equal(readback, img_data_counts[0, :, :, 0]))
+        bin_files._write_out(img_data_counts, tmpdir, fov_name, targets,
+                             intensities=intensities, multipage=True, write_buffer_size=1024)
+        readback = tifffile.imread(os.path.join(tmpdir, f'{fov_name}.tiff'), key=range(5))
+        assert (np.array_equal(readback, np.moveaxis(img_data_counts[0], -1, 0)))
+
+    with pytest.raises(ValueError, match='Unsupported compression'):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bin_files._write_out(img_data_compact, tmpdir, fov_name, targets,
+                                 compression='lz4')
+
+
+def test_mass2tof():
+    masses = np.array([[89.0, 98.0, 175.0], [88.7, 97.7, 174.7]])
+    offset, gain, time_res = 0.5, 2.0, 500e-6
+
+    np.testing.assert_allclose(bin_files._mass2tof(masses, offset, gain, time_res),
+                               (offset + gain * np.sqrt(masses)) / time_res)
+
+    # per fov calibrations broadcast against shared mass ranges
+    offsets = np.array([0.5, -0.5])[:, np.newaxis, np.newaxis]
+    gains = np.array([2.0, 2.5])[:, np.newaxis, np.newaxis]
+    tofs = bin_files._mass2tof(masses, offsets, gains, time_res)
+    assert (tofs.shape == (2, *masses.shape))
+    for i in range(2):
+        np.testing.assert_allclose(tofs[i], bin_files._mass2tof(masses, offsets[i, 0, 0],
+                                                                gains[i, 0, 0], time_res))
+
 
 def test_condense_img_data():
     pulse = [[[[0, 0, 0, 0, 0]]]]
@@ -171,9 +285,27 @@ def test_condense_img_data():
     assert (np.array_equal(not_replaced_data, img_data))
 
 
+def test_stack_fovs():
+    def _fov_array(name, channels, value):
+        return xr.DataArray(
+            data=np.full((1, 1, 2, 2, len(channels)), value, dtype=np.uint32),
+            coords=[[name], ['pulse'], np.arange(2), np.arange(2), channels],
+            dims=['fov', 'type', 'x', 'y', 'channel'],
+        )
+
+    # matching fovs are stacked into the preallocated array
+    fov_arrays = [_fov_array('fov1', ['a', 'b'], 1), _fov_array('fov2', ['a', 'b'], 2)]
+    stacked = bin_files._stack_fovs(fov_arrays, ['fov1', 'fov2'])
+    assert (stacked.equals(xr.concat(fov_arrays, dim='fov')))
+
+    # mismatched fovs fall back to xarray alignment
+    fov_arrays.append(_fov_array('fov3', ['a', 'c'], 3))
+    stacked = bin_files._stack_fovs(fov_arrays, ['fov1', 'fov2', 'fov3'])
+    assert (stacked.identical(xr.concat(fov_arrays, dim='fov')))
+
+
 def _make_blank_file(folder: str, name: str):
-    with open(os.path.join(folder, name), 'w'):
-        pass
+    os.close(os.open(os.path.join(folder, name), os.O_CREAT | os.O_WRONLY, 0o644))
 
 
 def test_find_bin_files():
@@ -196,6 +328,12 @@ def test_find_bin_files():
             if make_json:
                 _make_blank_file(tmpdir, f'{fov_name}.json')
 
+        # directories and names only containing the extensions are not fovs
+        os.mkdir(os.path.join(tmpdir, 'fov6.bin'))
+        _make_blank_file(tmpdir, 'fov6.json')
+        _make_blank_file(tmpdir, 'fov7.bin.bak')
+        _make_blank_file(tmpdir, 'fov7.json')
+
         # correctness
         fov_dict = bin_files._find_bin_files(tmpdir)
         assert (set(fov_dict.keys()) == {'fov1', 'fov2', 'fov3'})
@@ -204,35 +342,65 @@ def test_find_bin_files():
         fov_dict = bin_files._find_bin_files(tmpdir, include_fovs=include_fovs)
         assert (set(fov_dict.keys()) == set(include_fovs))
 
+        # unpaired, misspelled or directory fovs are skipped
+        fov_dict = bin_files._find_bin_files(tmpdir, include_fovs=['fov4', 'fov5', 'fov6',
+                                                                   'fov_fake', 'fov1'])
+        assert (list(fov_dict.keys()) == ['fov1'])
+
         with pytest.raises(FileNotFoundError, match='No viable bin file'):
             fov_dict = bin_files._find_bin_files(tmpdir, include_fovs=['fov_fake'])
 
 
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+def test_read_fov_json(test_dir, fov, monkeypatch):
+    json_path = os.path.join(test_dir, fov['json'])
+    with open(json_path, 'r') as f:
+        expected = json.load(f)
+
+    assert (bin_files._read_fov_json(json_path) == expected)
+
+    # unchanged files are only parsed once
+    assert (bin_files._read_fov_json(json_path) is bin_files._read_fov_json(json_path))
+
+    # stdlib fallback when orjson isn't installed
+    monkeypatch.setattr(bin_files, 'orjson', None)
+    bin_files._parse_fov_json.cache_clear()
+    assert (bin_files._read_fov_json(json_path) == expected)
+
+    # edited files are parsed again
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp_path = os.path.join(tmpdir, fov['json'])
+        with open(tmp_path, 'w') as f:
+            json.dump(expected, f)
+        assert (bin_files._read_fov_json(tmp_path) == expected)
+        with open(tmp_path, 'w') as f:
+            json.dump({'fov': {}}, f)
+        assert (bin_files._read_fov_json(tmp_path) == {'fov': {}})
+
+
 class FovMetadataCases:
+    # metadata parsing ignores `replace`, so it is not crossed in here
     @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles, has_tag='tissue')
     @parametrize_with_cases('panel', cases=FovMetadataTestPanels)
     @parametrize_with_cases('channels', cases=FovMetadataTestChannels)
     @parametrize_with_cases('intensities', cases=FovMetadataTestIntensities)
-    @parametrize_with_cases('replace', cases=FovMetadataTestReplace)
-    def case_tissue(self, test_dir, fov, panel, channels, intensities, replace):
-        return test_dir, fov, panel, channels, intensities, replace
+    def case_tissue(self, test_dir, fov, panel, channels, intensities):
+        return test_dir, fov, panel, channels, intensities
 
     @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles, has_tag='moly')
     @parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='specified')
     @parametrize_with_cases('channels', cases=FovMetadataTestChannels)
     @parametrize_with_cases('intensities', cases=FovMetadataTestIntensities)
-    @parametrize_with_cases('replace', cases=FovMetadataTestReplace)
-    def case_moly(self, test_dir, fov, panel, channels, intensities, replace):
-        return test_dir, fov, panel, channels, intensities, replace
+    def case_moly(self, test_dir, fov, panel, channels, intensities):
+        return test_dir, fov, panel, channels, intensities
 
     @pytest.mark.xfail(raises=KeyError, strict=True)
     @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles, has_tag='moly')
     @parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='global')
     @parametrize_with_cases('channels', cases=FovMetadataTestChannels)
     @parametrize_with_cases('intensities', cases=FovMetadataTestIntensities)
-    @parametrize_with_cases('replace', cases=FovMetadataTestReplace)
-    def case_global_panel_moly(self, test_dir, fov, panel, channels, intensities, replace):
-        return test_dir, fov, panel, channels, intensities, replace
+    def case_global_panel_moly(self, test_dir, fov, panel, channels, intensities):
+        return test_dir, fov, panel, channels, intensities
 
 
 @parametrize_with_cases('test_dir, fov, panel, channels, intensities', cases=FovMetadataCases)
@@ -242,6 +410,41 @@ def test_fill_fov_metadata(test_dir, fov, panel, channels, intensities):
     bin_files._fill_fov_metadata(test_dir, fov, panel, intensities, time_res, channels)
 
 
+@parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='global')
+@parametrize_with_cases('intensities', cases=FovMetadataTestIntensities)
+def test_fill_fovs_metadata(panel, intensities, tissue_fov_files):
+    test_dir = TEST_DIRS['tissue']
+    time_res = 500e-6
+    fovs = _copy_fovs(tissue_fov_files)
+    expected_fovs = _copy_fovs(tissue_fov_files)
+
+    # fovs converted together match fovs converted one by one
+    bin_files._fill_fovs_metadata(test_dir, fovs.values(), panel, intensities, time_res)
+    for fov_name, expected_fov in expected_fovs.items():
+        bin_files._fill_fov_metadata(test_dir, expected_fov, panel, intensities, time_res)
+        assert (fovs[fov_name]['targets'] == expected_fov['targets'])
+        for key in ('lower_tof_range', 'upper_tof_range', 'tof_order', 'calc_intensity'):
+            assert (np.array_equal(fovs[fov_name][key], expected_fov[key]))
+
+
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+@parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='specified')
+@parametrize_with_cases('channels', cases=FovMetadataTestChannels)
+@parametrize_with_cases('intensities', cases=FovMetadataTestIntensities)
+def test_prepare_df_panel(test_dir, fov, panel, channels, intensities):
+    time_res = 0.5
+    prepared_fov = dict(fov)
+    bin_files._fill_fov_metadata(test_dir, fov, panel, intensities, time_res, channels)
+    bin_files._fill_fov_metadata(test_dir, prepared_fov,
+                                 bin_files._prepare_df_panel(panel, channels), intensities,
+                                 time_res)
+
+    # a prepared panel gives the same metadata as the panel itself
+    assert (prepared_fov['targets'] == fov['targets'])
+    for key in ('masses', 'lower_tof_range', 'upper_tof_range', 'calc_intensity'):
+        assert (np.array_equal(prepared_fov[key], fov[key]))
+
+
 # only checking specified panel here since it's easier to validate the file structure
 @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
 @parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='specified')
@@ -271,11 +474,182 @@ def test_extract_bin_files(test_dir, fov, panel, intensities, replace, filepath_
         comp = test_xr[0].values == test_xr[1].values
         assert (not np.all(comp))
 
+    # test serial extraction matches threaded extraction
+    serial_xr = bin_files.extract_bin_files(test_dir, None, None, panel, intensities,
+                                            replace, time_res, maxworkers=1)
+    assert (serial_xr.equals(test_xr))
+
+
+def test_extract_bin_files_written_data():
+    test_dir = TEST_DIRS['tissue']
+    panel = (-0.3, 0.0)
+    expected = bin_files.extract_bin_files(test_dir, None, panel=panel)
+
+    # a single thread alternates buffers, extracting each fov while the last one is written
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bin_files.extract_bin_files(test_dir, tmpdir, panel=panel, maxworkers=1)
+        for fov_name in expected.fov.values:
+            for target in expected.channel.values:
+                readback = tifffile.imread(os.path.join(tmpdir, fov_name, f'{target}.tiff'))
+                assert (np.array_equal(readback, expected.loc[fov_name, 'pulse', :, :, target]))
+
+
+def test_extract_bin_files_zarr(monkeypatch):
+    test_dir = TEST_DIRS['tissue']
+    panel = (-0.3, 0.0)
+
+    with pytest.raises(ValueError, match='output_format'):
+        bin_files.extract_bin_files(test_dir, 'out', panel=panel, output_format='hdf5')
+
+    with monkeypatch.context() as m:
+        m.setattr(zarr_store, 'zarr', None)
+        with pytest.raises(ImportError, match='zarr'):
+            bin_files.extract_bin_files(test_dir, 'out', panel=panel, output_format='zarr')
+
+    zarr = pytest.importorskip('zarr')
+    expected = bin_files.extract_bin_files(test_dir, None, panel=panel)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bin_files.extract_bin_files(test_dir, tmpdir, panel=panel, output_format='zarr')
+        root = zarr.open_group(tmpdir, mode='r')
+        for fov_name in expected.fov.values:
+            for target in expected.channel.values:
+                np.testing.assert_array_equal(
+                    root[fov_name][target][:],
+                    expected.loc[fov_name, 'pulse', :, :, target].values
+                )
+
+
+def test_zarr_open_root_serialized(monkeypatch):
+    active, overlaps = [], []
+
+    class _SlowZarr:
+        # stands in for zarr, recording whether root groups are ever opened concurrently
+        @staticmethod
+        def open_group(store, mode):
+            active.append(store)
+            overlaps.append(len(active) > 1)
+            time.sleep(0.01)
+            active.remove(store)
+            return store
+
+    monkeypatch.setattr(zarr_store, 'zarr', _SlowZarr)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        roots = list(executor.map(zarr_store.open_root, ['out'] * 16))
+
+    assert (roots == ['out'] * 16)
+    assert (not any(overlaps))
+
+
+def test_zarr_write_default_compression(monkeypatch):
+    datasets = {}
+
+    class _Group:
+        def create_dataset(self, name, **kwargs):
+            datasets[name] = kwargs
+
+    class _Blosc:
+        SHUFFLE = 1
+
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+    monkeypatch.setattr(zarr_store, 'Blosc', _Blosc)
+    zarr_store.write(_Group(), 'SMA', np.zeros((2, 2), dtype=np.uint32))
+
+    # direct writes use the same codec as extract_bin_files
+    default = inspect.signature(bin_files.extract_bin_files).parameters['compression'].default
+    assert (datasets['SMA']['compressor'].kwargs['cname'] == default)
+
+
+def test_extract_bin_files_zarr_threaded():
+    zarr = pytest.importorskip('zarr')
+    test_dir = TEST_DIRS['tissue']
+    panel = (-0.3, 0.0)
+    expected = bin_files.extract_bin_files(test_dir, None, panel=panel)
+
+    # many fovs written to a new store at once
+    with tempfile.TemporaryDirectory() as data_dir:
+        for i in range(16):
+            for ext in ('bin', 'json'):
+                shutil.copy(os.path.join(test_dir, f'fov-{i % 2 + 1}-scan-1.{ext}'),
+                            os.path.join(data_dir, f'fov-{i}-scan-1.{ext}'))
+        for _ in range(3):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                bin_files.extract_bin_files(data_dir, tmpdir, panel=panel, maxworkers=16,
+                                            output_format='zarr')
+                root = zarr.open_group(tmpdir, mode='r')
+                for i in range(16):
+                    source = expected.loc[f'fov-{i % 2 + 1}-scan-1', 'pulse']
+                    for target in expected.channel.values:
+                        np.testing.assert_array_equal(root[f'fov-{i}-scan-1'][target][:],
+                                                      source.loc[:, :, target].values)
+
+
+@parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='specified')
+@parametrize_with_cases('intensities', cases=FovMetadataTestIntensities)
+@parametrize_with_cases('replace', cases=FovMetadataTestReplace)
+def test_extract_fov_batch(panel, intensities, replace, tissue_fov_files):
+    test_dir = TEST_DIRS['tissue']
+    time_res = 500e-6
+
+    fovs = list(_copy_fovs(tissue_fov_files).values())
+    for fov in fovs:
+        bin_files._fill_fov_metadata(test_dir, fov, panel, intensities, time_res)
+    bfs = [os.path.join(test_dir, fov['bin']) for fov in fovs]
+    extraction_arrays = bin_files._gather_extraction_arrays(fovs)
+
+    assert (bin_files._is_batchable(fovs, bfs, extraction_arrays[0]))
+    batch_xr = bin_files._extract_fov_batch(fovs, bfs, *extraction_arrays, intensities,
+                                            replace, maxworkers=2)
+
+    # batched extraction matches fov by fov extraction
+    fov_arrays = [
+        bin_files._extract_fov(fov, bf, *fov_extraction_arrays, None, intensities, replace)
+        for fov, bf, *fov_extraction_arrays in zip(fovs, bfs, *extraction_arrays)
+    ]
+    assert (batch_xr.equals(xr.concat(fov_arrays, dim='fov')))
+
+    # only the kept types are allocated, and returned without a copy
+    assert (batch_xr.values.flags['C_CONTIGUOUS'])
+    assert (batch_xr.values.base is None)
+
+
+def test_extract_bin_files_unsorted_panel():
+    test_dir = TEST_DIRS['tissue']
+    panel = pd.DataFrame([
+        {'Mass': 89, 'Target': 'SMA', 'Start': 88.7, 'Stop': 89.0},
+        {'Mass': 113, 'Target': 'CD11c', 'Start': 112.7, 'Stop': 113.0},
+        {'Mass': 98, 'Target': 'Na', 'Start': 97.7, 'Stop': 98.0},
+    ])
+    sorted_panel = panel.sort_values('Mass', ignore_index=True)
+
+    expected = bin_files.extract_bin_files(test_dir, None, panel=sorted_panel)
+    expected = expected.reindex(channel=panel['Target'].values)
+
+    # channels come back in panel order, both batched and fov by fov
+    test_xr = bin_files.extract_bin_files(test_dir, None, panel=panel)
+    assert (test_xr.equals(expected))
+
+    fov = bin_files._find_bin_files(test_dir)['fov-1-scan-1']
+    bin_files._fill_fov_metadata(test_dir, fov, panel, False, 500e-6)
+    lower, upper, calc = bin_files._gather_extraction_arrays([fov])
+    fov_xr = bin_files._extract_fov(fov, os.path.join(test_dir, fov['bin']), lower[0], upper[0],
+                                    calc[0], None, False, True)
+    assert (fov_xr.equals(expected.sel(fov=['fov-1-scan-1'])))
+
+    # intensities are matched to their channels while still in tof order
+    for replace in (True, False):
+        test_xr = bin_files.extract_bin_files(test_dir, None, panel=panel, intensities=['Na'],
+                                              replace=replace)
+        expected = bin_files.extract_bin_files(test_dir, None, panel=sorted_panel,
+                                               intensities=['Na'], replace=replace)
+        assert (test_xr.equals(expected.reindex(channel=panel['Target'].values)))
+
 
 @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
 @parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='specified')
 def test_get_width_histogram(test_dir, fov, panel):
-    bin_files.get_histograms_per_tof(
+    widths, intensities, pulses = bin_files.get_histograms_per_tof(
         test_dir,
         fov['json'].split('.')[0],
         'SMA',
@@ -283,11 +657,14 @@ def test_get_width_histogram(test_dir, fov, panel):
         time_res=500e-6
     )
 
+    # one intensity bin per uint16 value, including 65535
+    assert ((widths.shape, intensities.shape, pulses.shape) == ((256,), (65536,), (256,)))
+
 
 @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
 @parametrize_with_cases('panel', cases=FovMetadataTestPanels, has_tag='specified')
 def test_median_height_vs_mean_pp(test_dir, fov, panel):
-    bin_files.get_median_pulse_height(
+    median_height = bin_files.get_median_pulse_height(
         test_dir,
         fov['json'].split('.')[0],
         'SMA',
@@ -295,14 +672,267 @@ def test_median_height_vs_mean_pp(test_dir, fov, panel):
         500e-6
     )
 
+    # the height whose cumulative share is closest to half, the lower one on ties
+    _, intensities, _ = bin_files.get_histograms_per_tof(
+        test_dir, fov['json'].split('.')[0], 'SMA', panel, 500e-6
+    )
+    int_bin = np.cumsum(intensities) / intensities.sum()
+    assert (median_height == np.abs(int_bin - 0.5).argmin())
+
+
+@parametrize(('fov', 'channel', 'expected'), (
+    ('fov-1-scan-1', 'CD4', 3125),
+    ('fov-2-scan-1', 'CD4', 4080),
+    ('fov-2-scan-1', 'CD69', 4089),
+))
+def test_median_pulse_height_values(fov, channel, expected):
+    assert (bin_files.get_median_pulse_height(TEST_DIRS['tissue'], fov, channel) == expected)
+
+
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+def test_c_extract_histograms_buf(test_dir, fov):
+    bf = os.path.join(test_dir, fov['bin'])
+    expected = _extract_bin.c_extract_histograms(bytes(bf, 'utf-8'), 0, 65535)
+    with open(bf, 'rb') as f:
+        contents = f.read()
+
+    histograms = _extract_bin.c_extract_histograms_buf(contents, 0, 65535)
+    for histogram, expected_histogram in zip(histograms, expected):
+        assert (np.array_equal(histogram, expected_histogram))
+
+    # truncated files are read up to their last complete trigger
+    truncated = _extract_bin.c_extract_histograms_buf(contents[:len(contents) // 2], 0, 65535)
+    assert (0 < truncated[0].sum() < expected[0].sum())
+
+
+def _synthetic_bin(pulses_per_trigger):
+    # 1x1 pixel, single frame bin file; each trigger holds (time, width, intensity) pulses
+    header = np.zeros(0x12, dtype=np.uint8)
+    header[0x6:0xE] = np.array([1, 1, len(pulses_per_trigger), 1], dtype='<u2').view(np.uint8)
+    body = [header.tobytes(), bytes(8)]
+    pulse_dtype = np.dtype([('time', '<u2'), ('width', 'u1'), ('intensity', '<u2')])
+    for pulses in pulses_per_trigger:
+        trigger = np.zeros(4, dtype='<u2')
+        trigger[3] = len(pulses)
+        body += [trigger.tobytes(), np.array(pulses, dtype=pulse_dtype).tobytes()]
+    return b''.join(body)
+
+
+def test_c_extract_bin_channel_lookup():
+    rng = np.random.default_rng(0)
+    low_range = np.sort(rng.choice(np.arange(1, 60000, 2), 40, replace=False)).astype(np.uint16)
+    high_range = (low_range + rng.integers(0, 1500, 40)).astype(np.uint16)
+
+    # mostly ascending pulse times with some falling back, as well as range edges
+    times = np.concatenate([np.sort(rng.integers(0, 65536, 400)), rng.integers(0, 65536, 100),
+                            low_range, high_range, [0, 65535]]).astype(np.uint16)
+    pulses = [(time, 1, 1) for time in times]
+
+    # a pulse belongs to the last range starting before it
+    chans = np.searchsorted(low_range, times, side='left') - 1
+    in_range = (chans >= 0) & (times <= high_range[chans])
+    expected = np.bincount(chans[in_range], minlength=40)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bf = os.path.join(tmpdir, 'fov-1-scan-1.bin')
+        with open(bf, 'wb') as f:
+            f.write(_synthetic_bin([pulses[:250], pulses[250:]]))
+        img_data = _extract_bin.c_extract_bin(bytes(bf, 'utf-8'), low_range, high_range,
+                                              np.zeros(40, dtype=np.uint8))
+
+    assert (np.array_equal(img_data[0, 0, 0], expected))
+
+
+def test_c_pulse_stats_and_histograms_buf_edges():
+    buf = _synthetic_bin([[(10, 3, 65535)], [(10, 1, 7)] * 300])
+    mean_pp, widths, intensities, pulse_counts = \
+        _extract_bin.c_pulse_stats_and_histograms_buf(buf, 0, 100)
+
+    # the full uint16 intensity range is histogrammed
+    assert (intensities.shape[0] == 65536)
+    assert (intensities[65535] == 1 and intensities[7] == 300)
+    assert (widths[3] == 1 and widths[1] == 300)
+
+    # triggers with 255 or more pulses in range share the last bin
+    assert (pulse_counts.shape[0] == 256)
+    assert (pulse_counts[1] == 1 and pulse_counts[255] == 1)
+    assert (pulse_counts.sum() == 2)
+    assert (mean_pp == 301)
+
+
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+def test_c_pulse_height_vs_positive_pixel(test_dir, fov):
+    bf = bytes(os.path.join(test_dir, fov['bin']), 'utf-8')
+    mean_pp, *histograms = _extract_bin.c_pulse_stats_and_histograms(bf, 8000, 9000)
+
+    # stats and histograms come from the same pass
+    for histogram, expected in zip(histograms, _extract_bin.c_extract_histograms(bf, 8000, 9000)):
+        assert (np.array_equal(histogram, expected))
+
+    # median pulse height is the middle of the sorted pulse heights
+    intensities = histograms[1]
+    pulse_heights = np.repeat(np.arange(intensities.shape[0]), intensities)
+    median_height, pp = _extract_bin.c_pulse_height_vs_positive_pixel(bf, 8000, 9000)
+    assert (median_height == np.sort(pulse_heights)[pulse_heights.shape[0] // 2])
+    assert (pp == mean_pp)
+    assert (mean_pp >= 1)
+
+    # no pulses within range
+    assert (_extract_bin.c_pulse_height_vs_positive_pixel(bf, 65534, 65534) == (0, 0.0))
+
+
+def test_c_pulse_stats_and_histograms_empty_file():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bf = os.path.join(tmpdir, 'fov-1-scan-1.bin')
+        open(bf, 'wb').close()
+        with pytest.raises(ValueError, match='is empty'):
+            _extract_bin.c_pulse_stats_and_histograms(bytes(bf, 'utf-8'), 0, 65535)
+
+
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+def test_c_extract_bin_out(test_dir, fov):
+    bf = bytes(os.path.join(test_dir, fov['bin']), 'utf-8')
+    low_range = np.array([0], dtype=np.uint16)
+    high_range = np.array([-1], dtype=np.uint16)
+    calc_intensity = np.array([True], dtype=np.uint8)
+    expected = _extract_bin.c_extract_bin(bf, low_range, high_range, calc_intensity)
+
+    # dirty buffers are zeroed and refilled in place
+    out = np.full_like(expected, 7)
+    img_data = _extract_bin.c_extract_bin(bf, low_range, high_range, calc_intensity, out)
+    assert (img_data is out)
+    assert (np.array_equal(out, expected))
+
+    with pytest.raises(ValueError, match='out must be'):
+        _extract_bin.c_extract_bin(bf, low_range, high_range, calc_intensity, out[:, 1:])
+
+
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+def test_c_extract_bin_batch_planes(test_dir, fov):
+    bf = bytes(os.path.join(test_dir, fov['bin']), 'utf-8')
+    num_x, num_y = _extract_bin.c_read_frame_size(bf)
+    low_range = np.array([0, 8000], dtype=np.uint16)
+    high_range = np.array([7999, 65535], dtype=np.uint16)
+    calc_intensity = np.array([[False, True]], dtype=np.uint8)
+    expected = _extract_bin.c_extract_bin(bf, low_range, high_range, calc_intensity[0])
+    expected = expected.reshape((3, num_x * num_y, 2))
+
+    def _extract_planes(num_planes):
+        out = np.zeros((1, num_planes, num_x * num_y, 2), dtype=np.uint32)
+        _extract_bin.c_extract_bin_batch([bf], low_range[np.newaxis], high_range[np.newaxis],
+                                         calc_intensity, out)
+        return out[0]
+
+    # fewer planes skip the trailing types
+    assert (np.array_equal(_extract_planes(2), expected[:2]))
+
+    # a single plane holds intensities in place of the flagged targets' pulse counts
+    single_plane = np.where(calc_intensity, expected[1], expected[0])
+    assert (np.array_equal(_extract_planes(1)[0], single_plane))
+
+    with pytest.raises(ValueError):
+        _extract_planes(4)
+
+
+@parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
+def test_scratch_pool(test_dir, fov):
+    bf = os.path.join(test_dir, fov['bin'])
+    num_x, num_y = _extract_bin.c_read_frame_size(bytes(bf, 'utf-8'))
+    scratch = bin_files._ScratchPool(2)
+
+    first = scratch.take(bf, 3)
+    second = scratch.take(bf, 3)
+    assert (first.shape == second.shape == (3, num_x, num_y, 3))
+    assert (first.flags['C_CONTIGUOUS'])
+    assert (not np.shares_memory(first, second))
+
+    # buffers are only handed out again once their writes are done
+    write = Future()
+    scratch.give_back(first, [write])
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        waiting = executor.submit(scratch.take, bf, 2)
+        time.sleep(0.05)
+        assert (not waiting.done())
+        write.set_result(None)
+        smaller = waiting.result(timeout=5)
+
+    # fewer targets reuse the existing allocation
+    assert (smaller.shape == (3, num_x, num_y, 2))
+    assert (smaller.flags['C_CONTIGUOUS'])
+    assert (np.shares_memory(smaller, first))
+
+    # more targets grow it, replacing the buffer that is too small
+    scratch.give_back(smaller)
+    larger = scratch.take(bf, 4)
+    assert (larger.shape == (3, num_x, num_y, 4))
+    assert (not np.shares_memory(larger, first))
+    assert (not np.shares_memory(larger, second))
+
+    # cleared pools allocate afresh
+    scratch.give_back(larger)
+    scratch.clear()
+    assert (not np.shares_memory(scratch.take(bf, 1), larger))
+
+
+def test_extract_bin_files_frees_scratch(monkeypatch):
+    pools = []
+
+    class _RecordedPool(bin_files._ScratchPool):
+        def __init__(self, max_buffers):
+            super().__init__(max_buffers)
+            pools.append(self)
+
+    monkeypatch.setattr(bin_files, '_ScratchPool', _RecordedPool)
+
+    # given back buffers are freed once the run is done
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bin_files.extract_bin_files(TEST_DIRS['tissue'], tmpdir, maxworkers=1)
+    assert (len(pools) == 1)
+    assert (pools[0]._free == [])
+
+
+def test_extract_fov_failed_write(monkeypatch, tissue_fov_files):
+    def _failing_write_out(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(bin_files, '_write_out', _failing_write_out)
+
+    test_dir = TEST_DIRS['tissue']
+    fov = dict(next(iter(tissue_fov_files.values())))
+    bin_files._fill_fov_metadata(test_dir, fov, (-0.3, 0.0), False, 500e-6)
+    bf = os.path.join(test_dir, fov['bin'])
+    extraction_arrays = [fov[key][fov['tof_order']]
+                         for key in ('lower_tof_range', 'upper_tof_range', 'calc_intensity')]
+    scratch = bin_files._ScratchPool(1)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(OSError, match='disk full'):
+            bin_files._extract_fov(fov, bf, *extraction_arrays, tmpdir, False, True,
+                                   scratch=scratch)
+
+    # failed fovs give their buffer back, so other fovs don't wait on it forever
+    taken = []
+    taker = threading.Thread(target=lambda: taken.append(scratch.take(bf, 1)), daemon=True)
+    taker.start()
+    taker.join(timeout=5)
+    assert (len(taken) == 1)
+
 
 @parametrize_with_cases('test_dir, fov', cases=FovMetadataTestFiles)
 def test_get_total_counts(test_dir, fov):
     total_counts = bin_files.get_total_counts(test_dir)
 
-    bf = os.path.join(test_dir, fov['bin'])
-    total_ion_image = _extract_bin.c_extract_bin(
-        bytes(bf, 'utf-8'), np.array([0], np.uint16),
-        np.array([-1], dtype=np.uint16), np.array([False], dtype=np.uint8)
+    # total ion images of every fov, extracted in one batch over the full tof range
+    fov_names = list(total_counts.keys())
+    bfs = [bytes(os.path.join(test_dir, f'{fov_name}.bin'), 'utf-8') for fov_name in fov_names]
+    num_x, num_y = _extract_bin.c_read_frame_size(bfs[0])
+    total_ion_images = np.zeros((len(bfs), 3, num_x * num_y, 1), dtype=np.uint32)
+    ranges_shape = (len(bfs), 1)
+    _extract_bin.c_extract_bin_batch(
+        bfs, np.zeros(ranges_shape, np.uint16), np.full(ranges_shape, 65535, np.uint16),
+        np.zeros(ranges_shape, np.uint8), total_ion_images
     )
-    assert (total_counts['fov-1-scan-1'] == np.sum(total_ion_image[0, :, :, :]))
+
+    assert (fov['bin'][:-4] in total_counts)
+    for fov_name, total_ion_image in zip(fov_names, total_ion_images):
+        assert (total_counts[fov_name] == np.sum(total_ion_image[0]))
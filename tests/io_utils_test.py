@@ -1,11 +1,20 @@
 import os
 import tempfile
-import pathlib
 import pytest
 
 from mibi_bin_tools import io_utils as iou
 
 
+def _make_blank_file(folder, name):
+    # a bare open/close, skipping pathlib's touch and its utime call
+    os.close(os.open(os.path.join(folder, name), os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def _same_names(names, expected):
+    # order-free comparison without sorting; names within a directory are unique
+    return set(names) == set(expected) and len(names) == len(expected)
+
+
 def test_list_files():
     # test extension matching
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -17,22 +26,22 @@ def test_list_files():
             'test.csv',
         ]
         for filename in filenames:
-            pathlib.Path(os.path.join(temp_dir, filename)).touch()
+            _make_blank_file(temp_dir, filename)
 
         # add extra folder (shouldn't be picked up)
         os.mkdir(os.path.join(temp_dir, 'badfolder_test'))
 
         # test substrs is None (default)
         get_all = iou.list_files(temp_dir)
-        assert sorted(get_all) == sorted(filenames)
+        assert _same_names(get_all, filenames)
 
         # test substrs is not list (single string)
         get_txt = iou.list_files(temp_dir, substrs='.txt')
-        assert sorted(get_txt) == sorted(filenames[0:2])
+        assert _same_names(get_txt, filenames[0:2])
 
         # test substrs is list
         get_test_and_other = iou.list_files(temp_dir, substrs=['.txt', '.out'])
-        assert sorted(get_test_and_other) == sorted(filenames[:3])
+        assert _same_names(get_test_and_other, filenames[:3])
 
     # test file name exact matching
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -42,22 +51,136 @@ def test_list_files():
             'c.tif'
         ]
         for filename in filenames:
-            pathlib.Path(os.path.join(temp_dir, filename)).touch()
+            _make_blank_file(temp_dir, filename)
 
         # add extra folder (shouldn't be picked up)
         os.mkdir(os.path.join(temp_dir, 'badfolder_test'))
 
         # test substrs is None (default)
         get_all = iou.list_files(temp_dir, exact_match=True)
-        assert sorted(get_all) == sorted(filenames)
+        assert _same_names(get_all, filenames)
 
         # test substrs is not list (single string)
         get_txt = iou.list_files(temp_dir, substrs='c', exact_match=True)
-        assert sorted(get_txt) == [filenames[2]]
+        assert get_txt == [filenames[2]]
 
         # test substrs is list
         get_test_and_other = iou.list_files(temp_dir, substrs=['c', 'chan'], exact_match=True)
-        assert sorted(get_test_and_other) == sorted(filenames[1:])
+        assert _same_names(get_test_and_other, filenames[1:])
+
+
+def test_list_file_stats(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for i, name in enumerate(['fov1.bin', 'fov2.bin', 'fov1.json']):
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                f.write('x' * i)
+        os.mkdir(os.path.join(temp_dir, 'fov3.bin'))
+
+        stats = iou.list_file_stats(temp_dir, substrs='.bin')
+        assert _same_names(stats['name'], ['fov1.bin', 'fov2.bin'])
+        for name, size, mtime in zip(stats['name'], stats['size'], stats['mtime']):
+            file_stat = os.stat(os.path.join(temp_dir, name))
+            assert size == file_stat.st_size
+            assert mtime == file_stat.st_mtime_ns
+
+        assert len(iou.list_file_stats(temp_dir, substrs='fov4')['size']) == 0
+
+        # broken symlinks are skipped rather than failing the listing
+        os.symlink(os.path.join(temp_dir, 'missing.bin'), os.path.join(temp_dir, 'fov5.bin'))
+        stats = iou.list_file_stats(temp_dir, substrs='.bin')
+        assert _same_names(stats['name'], ['fov1.bin', 'fov2.bin'])
+        os.remove(os.path.join(temp_dir, 'fov5.bin'))
+
+        # same matching rules as list_files, from a single directory scan
+        scandir = os.scandir
+        scans = []
+        monkeypatch.setattr(iou.os, 'scandir', lambda path: scans.append(path) or scandir(path))
+        for substrs, exact_match in [(None, False), ('fov1', True), (['fov2', 'json'], False)]:
+            stats = iou.list_file_stats(temp_dir, substrs, exact_match)
+            assert _same_names(stats['name'], iou.list_files(temp_dir, substrs, exact_match))
+        assert len(scans) == 6
+
+
+def test_list_files_many():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        run_dirs = [os.path.join(temp_dir, f'run{i}') for i in range(3)]
+        for i, run_dir in enumerate(run_dirs):
+            os.mkdir(run_dir)
+            for j in range(i + 1):
+                _make_blank_file(run_dir, f'fov{j}.bin')
+            _make_blank_file(run_dir, 'fov0.json')
+
+        # listings are returned in directory order
+        listings = iou.list_files_many(run_dirs, substrs='.bin', maxworkers=2)
+        assert listings == [iou.list_files(run_dir, substrs='.bin') for run_dir in run_dirs]
+        assert [len(listing) for listing in listings] == [1, 2, 3]
+
+        assert iou.list_files_many([]) == []
+
+
+def test_walk_files(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.makedirs(os.path.join(temp_dir, 'run1', 'fov1'))
+        for folder, name in [('', 'fov0.bin'), ('run1', 'fov1.bin'), ('run1/fov1', 'fov1.json')]:
+            with open(os.path.join(temp_dir, folder, name), 'w') as f:
+                f.write(name)
+
+        def _read_walk(substrs=None):
+            contents = []
+            for dir_fd, name in iou.walk_files(temp_dir, substrs):
+                fd = os.open(name, os.O_RDONLY, dir_fd=dir_fd)
+                with os.fdopen(fd) as f:
+                    contents.append(f.read())
+            return contents
+
+        assert _same_names(_read_walk(), ['fov0.bin', 'fov1.bin', 'fov1.json'])
+        assert _same_names(_read_walk('.bin'), ['fov0.bin', 'fov1.bin'])
+
+        # platforms without fwalk get full paths instead
+        monkeypatch.delattr(os, 'fwalk', raising=False)
+        assert _same_names(_read_walk(['.json']), ['fov1.json'])
+
+
+def test_list_files_cache():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _make_blank_file(temp_dir, 'fov1.bin')
+
+        # recently modified directories are always listed afresh
+        assert iou.list_files(temp_dir, cache=True) == ['fov1.bin']
+        _make_blank_file(temp_dir, 'fov2.bin')
+        assert sorted(iou.list_files(temp_dir, cache=True)) == ['fov1.bin', 'fov2.bin']
+
+        # settled directories are listed once
+        os.utime(temp_dir, ns=(0, 0))
+        iou.clear_listing_cache()
+        assert sorted(iou.list_files(temp_dir, cache=True)) == ['fov1.bin', 'fov2.bin']
+        assert iou.list_folders(temp_dir, cache=True) == []
+        assert iou._scan_dir.cache_info().hits == 1
+
+        # and listed again once modified
+        os.mkdir(os.path.join(temp_dir, 'fov3'))
+        assert iou.list_folders(temp_dir, cache=True) == ['fov3']
+
+        # changes that leave the directory time untouched are only seen without the cache
+        os.utime(temp_dir, ns=(0, 0))
+        iou.clear_listing_cache()
+        assert iou.list_folders(temp_dir, cache=True) == ['fov3']
+        _make_blank_file(temp_dir, 'fov4.bin')
+        os.utime(temp_dir, ns=(0, 0))
+        assert 'fov4.bin' not in iou.list_files(temp_dir, cache=True)
+        assert 'fov4.bin' in iou.list_files(temp_dir)
+        assert iou.list_files_many([temp_dir], 'fov4') == [['fov4.bin']]
+        assert iou.list_files_many([temp_dir], 'fov4', cache=True) == [[]]
+
+        # until the cache is cleared
+        iou.clear_listing_cache()
+        assert 'fov4.bin' in iou.list_files(temp_dir, cache=True)
+
+        # listings are only cached when asked for
+        iou.clear_listing_cache()
+        iou.list_files(temp_dir)
+        iou.list_folders(temp_dir)
+        assert iou._scan_dir.cache_info().currsize == 0
 
 
 def test_remove_file_extensions():
@@ -82,6 +205,12 @@ def test_remove_file_extensions():
         new_files = iou.remove_file_extensions(['fov5.tar.gz', 'fov6.sample.csv'])
         assert new_files == ['fov5.tar', 'fov6.sample']
 
+    # paths and dotfiles are split like os.path.splitext
+    odd_files = ['.hidden', 'run.1/fov7', 'run.1/fov8.tiff', 'fov9.', 'fov10']
+    with pytest.warns(UserWarning):
+        new_files = iou.remove_file_extensions(odd_files)
+        assert new_files == [os.path.splitext(f)[0] for f in odd_files]
+
 
 def test_extract_delimited_names():
     filenames = [
@@ -101,6 +230,23 @@ def test_extract_delimited_names():
     assert ['fov1', 'fov2'] == iou.extract_delimited_names(filenames, delimiter='_')
 
 
+def test_iter_delimited_names():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filenames = [
+            'fov1_restofname.bin',
+            'fov2.bin',
+            'fov2.json',
+        ]
+        for filename in filenames:
+            _make_blank_file(temp_dir, filename)
+
+        # fused path matches the chained functions
+        chained = iou.extract_delimited_names(
+            iou.remove_file_extensions(iou.list_files(temp_dir, substrs='.bin')), delimiter='_')
+        assert sorted(iou.iter_delimited_names(temp_dir, substrs='.bin')) == sorted(chained)
+        assert sorted(iou.iter_delimited_names(temp_dir)) == ['fov1', 'fov2', 'fov2']
+
+
 def test_list_folders():
     with tempfile.TemporaryDirectory() as temp_dir:
         # set up temp_dir subdirs
@@ -114,16 +260,16 @@ def test_list_folders():
             os.mkdir(os.path.join(temp_dir, dirname))
 
         # add extra file
-        pathlib.Path(os.path.join(temp_dir, 'test_badfile.txt')).touch()
+        _make_blank_file(temp_dir, 'test_badfile.txt')
 
         # test substrs is None (default)
         get_all = iou.list_folders(temp_dir)
-        assert get_all.sort() == dirnames.sort()
+        assert _same_names(get_all, dirnames)
 
         # test substrs is not list (single string)
         get_txt = iou.list_folders(temp_dir, substrs='_txt')
-        assert get_txt.sort() == dirnames[0:2].sort()
+        assert _same_names(get_txt, dirnames[0:2])
 
         # test substrs is list
         get_test_and_other = iou.list_folders(temp_dir, substrs=['test_', 'other'])
-        assert get_test_and_other.sort() == dirnames[1:].sort()
+        assert _same_names(get_test_and_other, dirnames[1:])
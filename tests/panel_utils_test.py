@@ -1,7 +1,10 @@
+import numpy as np
+import pandas as pd
 import pytest
 from pytest_cases import parametrize_with_cases
 
 from mibi_bin_tools import panel_utils
+from mibi_bin_tools.type_utils import make_iterable
 
 
 class TestPanels:
@@ -42,4 +45,26 @@ class TestPanels:
 
 @parametrize_with_cases('mass, target_name, low_range, high_range', cases=TestPanels)
 def test_make_panel(mass, target_name, low_range, high_range):
-    _ = panel_utils.make_panel(mass,  target_name, low_range, high_range)
+    panel = panel_utils.make_panel(mass,  target_name, low_range, high_range)
+
+    assert (list(panel.columns) == ['Mass', 'Target', 'Start', 'Stop'])
+    assert (np.allclose(panel['Start'], np.subtract(mass, low_range)))
+    assert (np.allclose(panel['Stop'], np.add(mass, high_range)))
+    if target_name is not None:
+        assert (list(panel['Target']) == list(make_iterable(target_name)))
+
+
+def test_make_panels():
+    masses = np.array([89.0, 92.0, 98.0])
+    panel = panel_utils.make_panels(masses, ['Y89', 'Mo92', 'Mo98'], 0.3, [0.0, 0.1, 0.2])
+
+    assert (list(panel['Target']) == ['Y89', 'Mo92', 'Mo98'])
+    assert (isinstance(panel['Target'].dtype, pd.CategoricalDtype))
+    assert (np.allclose(panel['Start'], masses - 0.3))
+    assert (np.allclose(panel['Stop'], masses + [0.0, 0.1, 0.2]))
+
+    # single masses match make_panel
+    pd.testing.assert_frame_equal(
+        panel_utils.make_panels([98.0], ['Mo98'], 0.5, 0.5),
+        panel_utils.make_panel(98.0, 'Mo98', 0.5, 0.5)
+    )